@@ -0,0 +1,121 @@
+# -*- coding: utf-8; -*-
+# Copyright (c) 2014 Sebastian Wiesner <lunaryorn@gmail.com>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+"""Benchmark the docstring markup transformer on pathological input.
+
+Each case builds a docstring of a given length, which is known to make naive
+patterns for Emacs docstring markup backtrack: long unterminated quotes, long
+runs of nested key and keymap references, long backslash runs, and long runs
+of reference prefixes without any reference.
+
+The transformer is timed on each case at increasing lengths.  Since all
+quantifiers of the inline markup are bounded, the time must grow linearly with
+the length of the docstring.  The script exits with a non-zero status if any
+case grows faster than :data:`MAX_GROWTH` when the length doubles.
+
+Run it with::
+
+   python benchmarks/docstring_markup.py
+
+"""
+
+
+from __future__ import print_function
+
+import sys
+from timeit import repeat
+from argparse import ArgumentParser
+
+from sphinxcontrib.emacs.lisp.docstring import DocstringSourceTransformer
+
+
+#: The maximum growth of the time per doubling of the input length.
+#
+# Linear growth doubles the time; quadratic growth quadruples it.  The margin
+# absorbs timing noise.
+MAX_GROWTH = 3.0
+
+#: Times below this many seconds are too noisy to compute the growth from.
+MIN_TIME = 0.001
+
+#: Pathological docstrings, as functions of the desired length.
+CASES = [
+    ('unterminated literal', lambda n: '`' + 'a' * (n - 1)),
+    ('unterminated literals', lambda n: '`a' * (n // 2)),
+    ('backquotes', lambda n: '`' * n),
+    ('unterminated key', lambda n: '\\[' + 'a' * (n - 2)),
+    ('nested keys', lambda n: '\\[' * (n // 2)),
+    ('nested keymaps', lambda n: '\\{\\[\\<' * (n // 6)),
+    ('backslashes', lambda n: '\\' * n),
+    ('reference prefixes', lambda n: 'Function ' * (n // 9)),
+    ('unterminated references', lambda n: 'Info node `' * (n // 11)),
+    ('metavar run', lambda n: 'A-' * (n // 2)),
+    ('regular docstring', lambda n: (
+        'Call FUNCTION with `foo-bar\' bound, see `foo-mode\' and '
+        '\\[foo-frob] in \\{foo-mode-map}.\n') * (n // 80)),
+]
+
+
+def time_case(make_docstring, length, repetitions=3):
+    """Time the transformation of a docstring of ``length``.
+
+    Return the best time of ``repetitions`` in seconds.
+
+    """
+    docstring = make_docstring(length)
+    transformer = DocstringSourceTransformer()
+    return min(repeat(lambda: transformer.transform(docstring),
+                      number=1, repeat=repetitions))
+
+
+def main(argv=None):
+    """Run all benchmark cases and report their growth."""
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', dest='length', type=int, default=20000,
+                        help='Initial length of docstrings (default: 20000)')
+    parser.add_argument('-d', dest='doublings', type=int, default=4,
+                        help='Number of times to double the length '
+                        '(default: 4)')
+    args = parser.parse_args(argv)
+
+    lengths = [args.length * 2 ** i for i in range(args.doublings + 1)]
+    print('{0:<25} {1}  growth'.format(
+        'case', ' '.join('{0:>9}'.format(n) for n in lengths)))
+    failures = []
+    for name, make_docstring in CASES:
+        times = [time_case(make_docstring, length) for length in lengths]
+        growth = max([later / earlier
+                      for earlier, later in zip(times, times[1:])
+                      if earlier >= MIN_TIME] or [0])
+        print('{0:<25} {1}  {2:.2f}'.format(
+            name, ' '.join('{0:>8.4f}s'.format(t) for t in times), growth))
+        if growth > MAX_GROWTH:
+            failures.append(name)
+    if failures:
+        print('Super-linear growth: {0}'.format(', '.join(failures)))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,211 @@
+# -*- coding: utf-8; -*-
+# Copyright (c) 2014 Sebastian Wiesner <lunaryorn@gmail.com>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+"""Measure the startup cost of the Emacs Lisp domain.
+
+The domain creates its interpreter environment and its abstract interpreter on
+first use only, and the extension imports the Lisp machinery only when it is
+used, so that projects which neither require libraries nor auto-document
+symbols do not pay for them.
+
+This script first imports the extension in a fresh process, after Sphinx
+itself, and reports the import time and the modules loaded by the import.
+
+It then builds a generated project with manual descriptions only, once as
+is, and once with the interpreter forced at ``builder-inited``, as the domain
+did before.  Each build runs in a fresh process, and reports its wall time, its
+peak resident memory, and whether the interpreter environment was created.
+
+The script exits with a non-zero status if importing the extension loaded any
+of :data:`LAZY_MODULES`, or if the lazy build created an interpreter
+environment.
+
+Run it with::
+
+   python benchmarks/domain_startup.py
+
+"""
+
+
+from __future__ import print_function
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import subprocess
+from argparse import ArgumentParser
+
+
+#: Modules which importing the extension must not load.
+LAZY_MODULES = frozenset([
+    'sphinxcontrib.emacs.lisp', 'sphinxcontrib.emacs.lisp.store',
+    'sphinxcontrib.emacs.inventory', 'sphinxcontrib.emacs.scanner',
+    'sphinxcontrib.emacs.extract', 'sexpdata', 'sqlite3', 'multiprocessing',
+    'mmap', 'pygments.formatters'])
+
+#: Import the extension in a fresh process, and report the time and modules.
+IMPORT = """\
+import sys, json, time
+import sphinx.application
+before = set(sys.modules)
+start = time.time()
+import sphinxcontrib.emacs
+elapsed = time.time() - start
+json.dump({'time': elapsed,
+           'modules': sorted(name for name in set(sys.modules) - before
+                             if sys.modules[name] is not None)},
+          sys.stdout)
+"""
+
+CONF = """\
+import os
+
+extensions = ['sphinxcontrib.emacs']
+master_doc = 'index'
+emacs_lisp_load_path = [os.path.abspath('lisp')]
+
+
+def force_interpreter(app):
+    app.env.domains['el'].interpreter
+
+
+def setup(app):
+    if os.environ.get('EAGER_INTERPRETER'):
+        app.connect(str('builder-inited'), force_interpreter)
+"""
+
+LIBRARY = """\
+(defun foo-frob (arg)
+  "Frob ARG."
+  arg)
+
+(provide 'foo)
+"""
+
+#: Run a single build in a fresh process, and report its measurements.
+BUILD = """\
+import os, sys, json, time, resource, cPickle
+from sphinx import build_main
+start = time.time()
+status = build_main(['sphinx-build', '-q', '-b', 'html',
+                     sys.argv[1], sys.argv[2]])
+elapsed = time.time() - start
+with open(os.path.join(sys.argv[2], '.doctrees', 'environment.pickle'),
+          'rb') as source:
+    env = cPickle.load(source)
+json.dump({'status': status, 'time': elapsed,
+           'maxrss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+           'environment': env.domaindata['el']['environment'] is not None},
+          sys.stdout)
+"""
+
+
+def make_project(directory, symbols):
+    """Make a project with manual descriptions of ``symbols`` in ``directory``.
+
+    """
+    os.mkdir(os.path.join(directory, 'lisp'))
+    with open(os.path.join(directory, 'conf.py'), 'w') as sink:
+        sink.write(CONF)
+    with open(os.path.join(directory, 'lisp', 'foo.el'), 'w') as sink:
+        sink.write(LIBRARY)
+    with open(os.path.join(directory, 'index.rst'), 'w') as sink:
+        sink.write('Symbols\n=======\n\n')
+        for i in range(symbols):
+            sink.write('.. el:function:: foo-function-{0}\n\n'
+                       '   Does the {0}th thing.\n\n'.format(i))
+
+
+def measure(directory, eager):
+    """Build the project in ``directory`` and return its measurements."""
+    outdir = tempfile.mkdtemp()
+    environ = dict(os.environ)
+    if eager:
+        environ['EAGER_INTERPRETER'] = '1'
+    try:
+        output = subprocess.check_output(
+            [sys.executable, '-c', BUILD, directory, outdir], env=environ)
+    finally:
+        shutil.rmtree(outdir)
+    result = json.loads(output)
+    if result['status'] != 0:
+        raise RuntimeError('Build failed with status {0}'.format(
+            result['status']))
+    return result
+
+
+def measure_import():
+    """Import the extension in a fresh process and return its measurements.
+
+    """
+    return json.loads(subprocess.check_output([sys.executable, '-c', IMPORT]))
+
+
+def main(argv=None):
+    """Measure the import, and lazy and eager builds, and report the results.
+
+    """
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', dest='symbols', type=int, default=200,
+                        help='Number of described symbols (default: 200)')
+    parser.add_argument('-r', dest='repetitions', type=int, default=3,
+                        help='Number of builds of each variant (default: 3)')
+    args = parser.parse_args(argv)
+
+    imports = [measure_import() for _ in range(args.repetitions)]
+    modules = imports[0]['modules']
+    print('import time {0:.3f}s  {1} modules loaded'.format(
+        min(i['time'] for i in imports), len(modules)))
+    for name in modules:
+        print('  ' + name)
+    eager_modules = LAZY_MODULES.intersection(modules)
+
+    directory = tempfile.mkdtemp()
+    try:
+        make_project(directory, args.symbols)
+        results = {}
+        for variant, eager in [('lazy', False), ('eager', True)]:
+            runs = [measure(directory, eager)
+                    for _ in range(args.repetitions)]
+            results[variant] = runs
+            print('{0:<6} time {1:.3f}s  max RSS {2} KiB  environment: '
+                  '{3}'.format(variant, min(r['time'] for r in runs),
+                               min(r['maxrss'] for r in runs),
+                               'created' if any(r['environment']
+                                                for r in runs) else 'none'))
+    finally:
+        shutil.rmtree(directory)
+    if eager_modules:
+        print('Importing the extension loaded {0}'.format(
+            ', '.join(sorted(eager_modules))))
+        return 1
+    if any(r['environment'] for r in results['lazy']):
+        print('The lazy build created an interpreter environment')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,213 @@
+# -*- coding: utf-8; -*-
+# Copyright (c) 2014 Sebastian Wiesner <lunaryorn@gmail.com>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+"""Benchmark memoizing the nodes of markup roles.
+
+The ``var``, ``varcode`` and ``infonode`` roles are used over and over again
+with the same texts in typical manuals.  This script counts the uses and the
+distinct texts of these roles, and times the roles as they are against
+memoized variants: ``var`` and ``varcode`` copying a cached prototype node for
+each distinct text, and ``infonode`` caching the processed target.  The caches
+are unbounded dictionaries, which is the best case for memoization.
+
+The role texts are taken from all documents in a source directory, if given,
+or from a generated corpus, in which a few texts account for most uses.
+
+Run it with::
+
+   python benchmarks/roles.py [SOURCEDIR]
+
+"""
+
+
+from __future__ import print_function
+
+import os
+import re
+import sys
+import random
+from io import open
+from timeit import repeat
+from argparse import ArgumentParser
+
+from sphinxcontrib.emacs import roles
+
+
+#: Uses of the benchmarked roles in documents.
+ROLE_RE = re.compile(r':(?P<role>var|varcode|infonode):`(?P<text>[^`]+)`')
+
+#: Texts of the generated corpus, by role.
+GENERATED_TEXTS = {
+    'var': ['ARG', 'FILENAME', 'BUFFER', 'N', 'PROMPT', 'FEATURE'],
+    'varcode': ['(foo-frob {arg})', '(setq {var} {value})',
+                'M-x foo-{mode}', '{prefix}-mode-map', '(require {feature})'],
+    'infonode': ['(emacs)Key Bindings', '(elisp)Top', '(elisp)Keymaps',
+                 '(emacs)Init File', '(cl)Structures'],
+}
+
+
+class MemoizedInfoNodeXRefRole(roles.InfoNodeXRefRole):
+    """The ``infonode`` role, with processed targets cached."""
+
+    cache = {}
+
+    def process_link(self, env, refnode, has_explicit_title, title, target):
+        key = (has_explicit_title, title, target)
+        cached = self.cache.get(key)
+        if cached is None:
+            cached = self.cache[key] = roles.InfoNodeXRefRole.process_link(
+                self, env, refnode, has_explicit_title, title, target)
+        refnode['has_explicit_title'] = has_explicit_title
+        return cached
+
+
+def memoize_role(role_function):
+    """Memoize the nodes of ``role_function`` in prototypes.
+
+    Return a pair of the memoized role function and its cache.
+
+    """
+    cache = {}
+
+    def memoized(role, rawtext, text, lineno, inliner):
+        """Copy the cached prototype node for ``role`` and ``text``."""
+        prototype = cache.get((role, text))
+        if prototype is None:
+            prototype = cache[role, text] = role_function(
+                role, rawtext, text, lineno, inliner)[0][0]
+        node = prototype.deepcopy()
+        node.rawsource = rawtext
+        return [node], []
+
+    return memoized, cache
+
+
+def find_role_texts(sourcedir):
+    """Find the texts of all uses of the benchmarked roles in ``sourcedir``.
+
+    Return a dictionary mapping roles to lists of texts, in order of use.
+
+    """
+    texts = dict((role, []) for role in GENERATED_TEXTS)
+    for dirpath, dirnames, filenames in os.walk(sourcedir):
+        dirnames[:] = [d for d in dirnames if not d.startswith(('.', '_'))]
+        for filename in filenames:
+            if not filename.endswith(('.rst', '.txt')):
+                continue
+            with open(os.path.join(dirpath, filename),
+                      encoding='utf-8', errors='replace') as source:
+                for match in ROLE_RE.finditer(source.read()):
+                    texts[match.group('role')].append(match.group('text'))
+    return texts
+
+
+def generate_role_texts(uses):
+    """Generate ``uses`` texts for each benchmarked role.
+
+    Texts are drawn with a skewed distribution, so that the first texts of
+    each role are used most.
+
+    Return a dictionary mapping roles to lists of texts.
+
+    """
+    rng = random.Random(0)
+    return dict((role, [choices[min(int(rng.expovariate(1.0)),
+                                    len(choices) - 1)]
+                        for _ in range(uses)])
+                for role, choices in GENERATED_TEXTS.iteritems())
+
+
+def time_markup_role(role, function, texts, cache=None):
+    """Time ``function`` for ``role`` on all ``texts``.
+
+    Clear ``cache`` before each run, to account for cache misses.
+
+    Return the best time of three runs in seconds.
+
+    """
+    def run():
+        """Apply the role to all texts."""
+        if cache is not None:
+            cache.clear()
+        for text in texts:
+            function(role, ':{0}:`{1}`'.format(role, text), text, 1, None)
+    return min(repeat(run, number=1, repeat=3))
+
+
+def time_infonode_role(role_class, texts):
+    """Time the ``infonode`` role of ``role_class`` on all ``texts``.
+
+    Return the best time of three runs in seconds.
+
+    """
+    role = role_class()
+    cache = getattr(role_class, 'cache', None)
+
+    def run():
+        """Process the links of all texts."""
+        if cache is not None:
+            cache.clear()
+        for text in texts:
+            role.process_link(None, {}, False, text, text)
+    return min(repeat(run, number=1, repeat=3))
+
+
+def main(argv=None):
+    """Count the role texts, and time plain and memoized roles."""
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('sourcedir', nargs='?',
+                        help='Directory with document sources (default: '
+                        'a generated corpus)')
+    parser.add_argument('-n', dest='uses', type=int, default=20000,
+                        help='Uses of each role in the generated corpus '
+                        '(default: 20000)')
+    args = parser.parse_args(argv)
+
+    if args.sourcedir:
+        texts = find_role_texts(args.sourcedir)
+    else:
+        texts = generate_role_texts(args.uses)
+
+    print('{0:<10} {1:>7} {2:>9} {3:>10} {4:>10}'.format(
+        'role', 'uses', 'distinct', 'plain', 'memoized'))
+    for role in ['var', 'varcode', 'infonode']:
+        role_texts = texts[role]
+        if not role_texts:
+            continue
+        if role == 'infonode':
+            plain = time_infonode_role(roles.InfoNodeXRefRole, role_texts)
+            memoized = time_infonode_role(MemoizedInfoNodeXRefRole,
+                                          role_texts)
+        else:
+            function = getattr(roles, role)
+            memoized_function, cache = memoize_role(function)
+            plain = time_markup_role(role, function, role_texts)
+            memoized = time_markup_role(role, memoized_function, role_texts,
+                                        cache)
+        print('{0:<10} {1:>7} {2:>9} {3:>9.3f}s {4:>9.3f}s'.format(
+            role, len(role_texts), len(set(role_texts)), plain, memoized))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -80,6 +80,15 @@ setup(
     platforms='any',
     packages=find_packages(),
     include_package_data=True,
+    package_data={'sphinxcontrib.emacs': ['static/*']},
     install_requires=['Sphinx>=1.2', 'sexpdata>=0.0.3'],
     namespace_packages=['sphinxcontrib'],
+    entry_points={
+        'console_scripts': [
+            'sphinx-emacs-watch = sphinxcontrib.emacs.watch:main',
+            'sphinx-emacs-extract = sphinxcontrib.emacs.extract:main',
+            'sphinx-emacs-lint = sphinxcontrib.emacs.lint:main',
+            'sphinx-emacs-serve = sphinxcontrib.emacs.server:main',
+        ],
+    },
 )
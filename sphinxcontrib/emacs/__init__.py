@@ -32,9 +32,20 @@ from sphinx import addnodes
 
 from sphinxcontrib.emacs import nodes, visitors
 from sphinxcontrib.emacs.roles import InfoNodeXRefRole
-from sphinxcontrib.emacs.domain import EmacsLispDomain
+from sphinxcontrib.emacs.domain import (EmacsLispDomain, get_outdated_docs,
+                                        prefetch_features, finish_prefetch,
+                                        preload_features,
+                                        report_memory_usage)
+from sphinxcontrib.emacs.indices import update_indices
 from sphinxcontrib.emacs.info import resolve_info_references
-from sphinxcontrib.emacs.lisp import AbstractInterpreter
+from sphinxcontrib.emacs.coverage import EmacsLispCoverageBuilder
+from sphinxcontrib.emacs.jsonbuilder import EmacsLispJSONBuilder
+from sphinxcontrib.emacs.shard import export_or_merge_shards
+from sphinxcontrib.emacs.snapshot import (start_from_snapshot,
+                                          export_snapshot_after_build)
+from sphinxcontrib.emacs.viewcode import (add_source_links,
+                                          resolve_source_link, collect_pages)
+from sphinxcontrib.emacs.search import add_search_helper, write_search_index
 
 
 __version__ = '0.1'
@@ -51,7 +62,43 @@ def setup(app):
     app.add_domain(EmacsLispDomain)
     # Auto doc support
     app.add_config_value('emacs_lisp_load_path', [], 'env')
+    app.add_config_value('emacs_lisp_symbol_store', None, 'env')
+    app.add_config_value('emacs_lisp_prefetch_processes', 0, '')
+    app.add_config_value('emacs_lisp_preload', False, '')
+    app.add_config_value('emacs_lisp_report_memory', False, '')
     app.add_config_value('emacs_lisp_debug_docstring_parser', False, '')
+    # Start from a snapshot before preloading any features
+    app.add_config_value('emacs_lisp_snapshot', None, 'env')
+    app.add_config_value('emacs_lisp_snapshot_export', None, '')
+    app.connect(str('builder-inited'), start_from_snapshot)
+    app.connect(str('build-finished'), export_snapshot_after_build)
+    app.connect(str('builder-inited'), preload_features)
+    app.connect(str('env-get-outdated'), get_outdated_docs)
+    app.connect(str('env-get-outdated'), prefetch_features)
+    app.connect(str('env-updated'), finish_prefetch)
+    app.connect(str('env-updated'), update_indices)
+    app.connect(str('build-finished'), report_memory_usage)
+    # Symbol search
+    app.add_config_value('emacs_lisp_search_index', False, 'html')
+    app.connect(str('builder-inited'), add_search_helper)
+    app.connect(str('build-finished'), write_search_index)
+    # Sharded builds
+    app.add_config_value('emacs_lisp_shard_export', None, '')
+    app.add_config_value('emacs_lisp_shard_merge', [], '')
+    app.connect(str('env-updated'), export_or_merge_shards)
+    # Source code pages
+    app.add_config_value('emacs_lisp_viewcode', False, 'env')
+    app.connect(str('doctree-read'), add_source_links)
+    app.connect(str('missing-reference'), resolve_source_link)
+    app.connect(str('html-collect-pages'), collect_pages)
+    # Documentation coverage
+    app.add_builder(EmacsLispCoverageBuilder)
+    app.add_config_value('emacs_lisp_coverage_ignore_private', True, '')
+    # Per-symbol JSON output
+    app.add_builder(EmacsLispJSONBuilder)
+    app.add_config_value('emacs_lisp_json_base_url', '', '')
+    # Built-in symbols
+    app.add_config_value('emacs_lisp_builtin_inventory', None, 'env')
     # Texinfo references
     app.add_role('infonode', InfoNodeXRefRole())
     app.connect(str('missing-reference'), resolve_info_references)
@@ -0,0 +1,140 @@
+# -*- coding: utf-8; -*-
+# Copyright (c) 2014 Sebastian Wiesner <lunaryorn@gmail.com>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+"""Documentation coverage of Emacs Lisp features.
+
+The coverage builder compares all symbols loaded into the interpreter
+environment with the symbols described in the documentation, and reports all
+undocumented symbols per feature.  It writes no documents, but only a report
+in text and JSON format.
+
+"""
+
+
+import os
+import json
+from io import open
+
+from sphinx.builders import Builder
+
+
+#: Kinds of undocumented symbols, in order of appearance in reports.
+KINDS = ['functions', 'variables', 'options', 'faces']
+
+
+def symbol_kind(symbol, scope):
+    """Get the kind of ``symbol`` in ``scope`` for coverage reports.
+
+    Return one of :data:`KINDS`, or ``None``, if the scope is not covered.
+
+    """
+    if scope == 'function':
+        return 'functions'
+    elif scope == 'variable':
+        return ('options' if symbol.properties.get('user-option')
+                else 'variables')
+    elif scope == 'face':
+        return 'faces'
+    return None
+
+
+def is_private(name):
+    """Whether the symbol ``name`` is private by convention.
+
+    Private symbols contain a double dash, as in ``foo--bar``.
+
+    """
+    return '--' in name
+
+
+def find_undocumented(interpreter_env, namespace, ignore_private=True):
+    """Find all undocumented symbols in ``interpreter_env``.
+
+    ``namespace`` is the namespace of the Emacs Lisp domain.  If
+    ``ignore_private`` is ``True``, skip private symbols.
+
+    Return a dictionary mapping feature names to dictionaries, which map
+    :data:`KINDS` to sorted lists of undocumented symbol names.
+
+    """
+    undocumented = {}
+    for symbol in interpreter_env.top_level.itervalues():
+        if ignore_private and is_private(symbol.name):
+            continue
+        documented_scopes = namespace.get(symbol.name, {})
+        for scope, source in symbol.scopes.iteritems():
+            kind = symbol_kind(symbol, scope)
+            if kind and scope not in documented_scopes:
+                undocumented.setdefault(source.feature, {}).setdefault(
+                    kind, []).append(symbol.name)
+    for kinds in undocumented.itervalues():
+        for names in kinds.itervalues():
+            names.sort()
+    return undocumented
+
+
+class EmacsLispCoverageBuilder(Builder):
+    """Report undocumented Emacs Lisp symbols per feature."""
+
+    name = 'el-coverage'
+
+    def get_outdated_docs(self):
+        return 'coverage overview'
+
+    def write(self, *ignored):
+        data = self.env.domaindata['el']
+        interpreter_env = data['environment']
+        if interpreter_env is None:
+            undocumented = {}
+        else:
+            undocumented = find_undocumented(
+                interpreter_env, data['namespace'],
+                ignore_private=self.config.emacs_lisp_coverage_ignore_private)
+        self.write_text_report(undocumented)
+        self.write_json_report(undocumented)
+
+    def write_text_report(self, undocumented):
+        """Write a text report about ``undocumented`` symbols."""
+        filename = os.path.join(self.outdir, 'el-coverage.txt')
+        with open(filename, 'w', encoding='utf-8') as sink:
+            sink.write(u'Undocumented Emacs Lisp symbols\n'
+                       u'===============================\n')
+            for feature in sorted(undocumented):
+                title = feature or u'(no feature)'
+                sink.write(u'\n{0}\n{1}\n'.format(title, '-' * len(title)))
+                kinds = undocumented[feature]
+                for kind in KINDS:
+                    if kind in kinds:
+                        sink.write(u'\n{0}:\n'.format(kind.title()))
+                        for name in kinds[kind]:
+                            sink.write(u' * {0}\n'.format(name))
+        self.info('undocumented symbols written to {0}'.format(filename))
+
+    def write_json_report(self, undocumented):
+        """Write a JSON report about ``undocumented`` symbols."""
+        filename = os.path.join(self.outdir, 'el-coverage.json')
+        with open(filename, 'wb') as sink:
+            json.dump(undocumented, sink, indent=2, sort_keys=True)
+
+    def finish(self):
+        pass
@@ -32,7 +32,6 @@ from sphinx.util.nodes import set_source_info
 
 from sphinxcontrib.emacs import nodes
 from sphinxcontrib.emacs.util import make_target
-from sphinxcontrib.emacs.lisp.docstring import transform_emacs_markup_to_rst
 
 
 class EmacsLispSymbol(ObjectDescription):
@@ -152,8 +151,9 @@ class EmacsLispSymbol(ObjectDescription):
         """
         name = name or self.names[0]
         if 'auto' in self.options:
-            env = self.env.domaindata[self.domain]['environment']
-            symbol = env.top_level.get(name)
+            domain = self.env.domains[self.domain]
+            domain.note_consumer(self.env.docname, name)
+            symbol = domain.environment.top_level.get(name)
             if not symbol:
                 self.state_machine.reporter.warning(
                     'Undefined symbol {0}'.format(name), line=self.lineno)
@@ -217,6 +217,26 @@ class EmacsLispSymbol(ObjectDescription):
             node.append(version_node)
             return node
 
+    def transform_docstring(self, docstring):
+        """Transform the Emacs markup in ``docstring`` to ReST.
+
+        Substitute key bindings from the domain's interpreter environment, and
+        note this document as consumer of all commands and keymaps whose key
+        bindings were substituted.
+
+        Return the transformed docstring.
+
+        """
+        from sphinxcontrib.emacs.lisp.docstring import (
+            DocstringSourceTransformer)
+        domain = self.env.domains[self.domain]
+        transformer = DocstringSourceTransformer(
+            keymaps=domain.environment.key_index())
+        docstring_rst = transformer.transform(docstring)
+        for name in transformer.key_lookups:
+            domain.note_consumer(self.env.docname, name)
+        return docstring_rst
+
     def run(self):
         """Run this directive.
 
@@ -239,7 +259,7 @@ class EmacsLispSymbol(ObjectDescription):
                 self.before_content()
                 auto_paragraph = corenodes.paragraph()
                 cont_node.insert(0, auto_paragraph)
-                docstring_rst = transform_emacs_markup_to_rst(docstring)
+                docstring_rst = self.transform_docstring(docstring)
                 lines = string2lines(docstring_rst, tab_width=8,
                                      convert_whitespace=True)
                 self.state.nested_parse(StringList(lines), self.content_offset,
@@ -23,7 +23,10 @@
 """Miscellaneous directives of this extension."""
 
 
-from docutils.parsers.rst import Directive
+import os
+
+from docutils import nodes
+from docutils.parsers.rst import Directive, directives
 
 
 class RequireLibrary(Directive):
@@ -37,19 +40,100 @@ class RequireLibrary(Directive):
         """Run this directive.
 
         Load the feature with the abstract interpreter of
-        :class:`~sphinxcontrib.emacs.domain.EmacsLispDomain`, and make the
-        current document depend on the feature source.
+        :class:`~sphinxcontrib.emacs.domain.EmacsLispDomain`.
+
+        The current document does not depend on the feature source.  Instead
+        the domain tracks the symbols consumed by the document, and reads the
+        document again if any of these symbols changes.
 
         """
         self.domain, self.objtype = self.name.split(':', 1)
         env = self.state.document.settings.env
-        interpreter = env.domains['el'].interpreter
         feature = self.arguments[0]
 
         try:
-            interpreter.require(feature)
-            env.note_dependency(interpreter.locate(feature))
-        except LookupError as error:
+            env.domains['el'].interpreter.require(feature)
+        except (LookupError, ValueError) as error:
             self.state_machine.reporter.warning(unicode(error), line=self.lineno)
 
         return []
+
+
+class DescribeLibrary(Directive):
+    """Describe an Emacs Lisp library with the metadata of its header."""
+
+    required_arguments = 1
+    optional_arguments = 0
+    has_content = False
+    option_spec = {
+        'commentary': directives.flag,
+    }
+
+    def run(self):
+        """Run this directive.
+
+        Locate the library of the feature in the load path, and read its
+        header, without loading the library.  The current document depends on
+        the library file.
+
+        """
+        env = self.state.document.settings.env
+        feature = self.arguments[0]
+
+        try:
+            filename = env.domains['el'].interpreter.locate(feature)
+        except ValueError as error:
+            filename = None
+            self.state_machine.reporter.warning(unicode(error), line=self.lineno)
+        else:
+            if not filename:
+                self.state_machine.reporter.warning(
+                    'Cannot locate library: {0}'.format(feature),
+                    line=self.lineno)
+        if not filename:
+            return []
+
+        from sphinxcontrib.emacs.lisp.header import read_header
+        env.note_dependency(filename)
+        header = read_header(feature, filename)
+        node = nodes.container(classes=['el-library'])
+        title = nodes.paragraph()
+        title += nodes.strong(text=os.path.basename(filename))
+        if header.summary:
+            title += nodes.Text(u' \u2014 {0}'.format(header.summary))
+        node += title
+        fields = self.make_fields(header)
+        if fields.children:
+            node += fields
+        if 'commentary' in self.options:
+            for paragraph in '\n'.join(header.commentary).split('\n\n'):
+                if paragraph.strip():
+                    node += nodes.paragraph(text=paragraph.strip())
+        return [node]
+
+    def make_fields(self, header):
+        """Make a field list with the header fields of ``header``."""
+        fields = nodes.field_list()
+
+        def add_field(name, *body):
+            field = nodes.field()
+            field += nodes.field_name(text=name)
+            paragraph = nodes.paragraph()
+            paragraph.extend(body)
+            field += nodes.field_body('', paragraph)
+            fields.append(field)
+
+        if header.version:
+            add_field('Version', nodes.Text(header.version))
+        if header.requires:
+            add_field('Requires', nodes.Text(', '.join(
+                ' '.join(p for p in requirement if p)
+                for requirement in header.requires)))
+        if header.keywords:
+            add_field('Keywords', nodes.Text(', '.join(header.keywords)))
+        if header.author:
+            add_field('Author', nodes.Text(header.author))
+        if header.url:
+            add_field('URL', nodes.reference(header.url, header.url,
+                                             refuri=header.url))
+        return fields
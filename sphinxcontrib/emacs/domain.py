@@ -20,20 +20,28 @@
 # SOFTWARE.
 
 
-"""The domain class."""
+"""The domain class.
 
+The Lisp machinery is only imported when the domain first needs it, so that
+projects with only manual descriptions do not pay for the interpreter, the
+symbol store, the inventory or the worker processes.
 
+"""
+
+
+import os.path
 from itertools import ifilter
 
 from sphinx.roles import XRefRole
 from sphinx.domains import Domain, ObjType
 from sphinx.util.nodes import make_refnode
 
-from sphinxcontrib.emacs import lisp
 from sphinxcontrib.emacs import roles as rolefuncs
 from sphinxcontrib.emacs.directives import desc
-from sphinxcontrib.emacs.directives.other import RequireLibrary
-from sphinxcontrib.emacs.util import make_target
+from sphinxcontrib.emacs.directives.other import (RequireLibrary,
+                                                   DescribeLibrary)
+from sphinxcontrib.emacs.indices import INDICES
+from sphinxcontrib.emacs.util import make_target, symbol_initial
 
 
 class EmacsLispDomain(Domain):
@@ -70,6 +78,7 @@ class EmacsLispDomain(Domain):
         'cl-struct': desc.EmacsLispCLStruct,
         'cl-slot': desc.EmacsLispCLSlot,
         'require': RequireLibrary,
+        'library': DescribeLibrary,
     }
     roles = {
         'symbol': XRefRole(),
@@ -86,27 +95,237 @@ class EmacsLispDomain(Domain):
         'var': rolefuncs.var,
         'varcode': rolefuncs.varcode,
     }
-    indices = []
+    indices = INDICES
 
-    data_version = 4
+    data_version = 14
     initial_data = {
         # fullname -> scope -> (docname, objtype)
         'namespace': {},
+        # fullname -> set of docnames which consumed the symbol
+        'consumers': {},
         'features': set(),
         'environment': None,
+        # docnames whose data was merged from shards
+        'merged': set(),
     }
 
     def __init__(self, build_env):
         Domain.__init__(self, build_env)
+        # The interpreter and its environment are created on first use, so
+        # that projects without auto-documentation do not pay for them.
+        self._interpreter = None
+        self.prefetch_pool = None
+        self.index_groups = None
+        self.builtin_inventory = None
+        self.builtin_inventory_failed = False
+
+    @property
+    def environment(self):
+        """The interpreter environment of this domain.
+
+        Create a new environment with :meth:`make_environment` on first
+        access, if there is none yet.
+
+        """
+        if self.data['environment'] is None:
+            self.data['environment'] = self.make_environment(self.env)
+        return self.data['environment']
+
+    @property
+    def interpreter(self):
+        """The abstract interpreter of this domain.
+
+        Create the interpreter on first access.  Raise :exc:`ValueError`, if
+        ``emacs_lisp_load_path`` is empty.
+
+        """
+        if self._interpreter is None:
+            from sphinxcontrib.emacs.lisp import AbstractInterpreter
+            self._interpreter = AbstractInterpreter(
+                self.env.config.emacs_lisp_load_path, env=self.environment)
+        return self._interpreter
+
+    @staticmethod
+    def make_environment(build_env):
+        """Make a new interpreter environment for ``build_env``.
+
+        If ``emacs_lisp_symbol_store`` is set, return a
+        :class:`~sphinxcontrib.emacs.lisp.store.StoredEnvironment`.  If the
+        option is a string, it is the name of the database file, relative to
+        the doctree directory.  Otherwise use a default name inside the doctree
+        directory.
+
+        Otherwise return a plain in-memory environment.
+
+        """
+        store = build_env.config.emacs_lisp_symbol_store
+        if not store:
+            from sphinxcontrib.emacs.lisp import AbstractEnvironment
+            return AbstractEnvironment()
+        from sphinxcontrib.emacs.lisp.store import StoredEnvironment
+        if not isinstance(store, basestring):
+            store = 'emacs-lisp-symbols.db'
+        return StoredEnvironment(os.path.join(build_env.doctreedir, store))
+
+    def start_from_environment(self, environment):
+        """Start from the symbols and features of an ``environment``.
+
+        Make a new interpreter environment with :meth:`make_environment`, and
+        merge ``environment`` into it.
+
+        """
+        self.data['environment'] = self.make_environment(self.env)
+        self.data['environment'].merge(environment)
+
+    def note_consumer(self, docname, name):
+        """Note that ``docname`` consumed the symbol with ``name``.
+
+        The document is read again, whenever the definition of the symbol in
+        the interpreter environment changes.
+
+        """
+        self.data['consumers'].setdefault(name, set()).add(docname)
+
+    def refresh_environment(self):
+        """Re-evaluate all outdated libraries in the interpreter environment.
+
+        Return a set with the names of all documents which consumed a symbol
+        whose definition changed.  If ``emacs_lisp_viewcode`` is set, source
+        links depend on the lines of definitions, so definitions which only
+        moved count as changed, too.  If the environment was reset, return all
+        documents, because the documents which required the lost features
+        must be read again, too.
+
+        """
         interpreter_env = self.data['environment']
-        if interpreter_env and interpreter_env.outdated:
-            # Reset the environment if it is outdated
-            interpreter_env = None
+        if interpreter_env is None:
+            # Nothing was ever loaded, so nothing can be outdated
+            return set()
+        consumers = self.data['consumers']
+        if interpreter_env.reset:
+            interpreter_env.reset = False
+            return set(self.env.found_docs)
+        changed_symbols = set()
+        reloaded = set()
+        for feature in sorted(interpreter_env.outdated_features()):
+            # Reloading a library provides all of its features again
+            if feature.filename in reloaded:
+                continue
+            reloaded.add(feature.filename)
+            changed_symbols.update(self.interpreter.reload(
+                feature.name,
+                report_moved=self.env.config.emacs_lisp_viewcode))
+        docnames = set()
+        for name in changed_symbols:
+            docnames.update(consumers.get(name, ()))
+        return docnames
+
+    def start_prefetch(self, features, processes):
+        """Start to parse the libraries of ``features`` in the background.
+
+        ``processes`` is the number of worker processes to parse libraries in.
+
+        """
+        if self.prefetch_pool is None:
+            from multiprocessing import Pool
+            self.prefetch_pool = Pool(processes)
+        self.interpreter.prefetch(features, self.prefetch_pool)
+
+    def finish_prefetch(self):
+        """Stop parsing libraries in the background.
+
+        Discard all results which were not used while reading documents.
+
+        """
+        if self.prefetch_pool is not None:
+            self.prefetch_pool.terminate()
+            self.prefetch_pool = None
+        if self._interpreter is not None:
+            self._interpreter.pending.clear()
+
+    def get_index_groups(self):
+        """Get all documented symbols, grouped by their initial.
+
+        Return a dictionary mapping initials, as returned by
+        :func:`~sphinxcontrib.emacs.util.symbol_initial`, to sorted lists of
+        ``(name, scope, docname, objtype)`` tuples.  The groups are computed in
+        a single sorted pass over the namespace, and shared by all indices of
+        this domain.
+
+        """
+        if self.index_groups is None:
+            namespace = self.data['namespace']
+            groups = {}
+            for name in sorted(namespace):
+                group = groups.setdefault(symbol_initial(name), [])
+                for scope, (docname, objtype) in sorted(
+                        namespace[name].iteritems()):
+                    group.append((name, scope, docname, objtype))
+            self.index_groups = groups
+        return self.index_groups
+
+    def process_doc(self, env, docname, document):
+        # The namespace changed, so recompute the index groups
+        self.index_groups = None
+
+    def preload(self, features):
+        """Load all ``features`` into the interpreter environment.
+
+        If prefetching is enabled, parse all libraries in the background
+        first.
+
+        Return a list of error messages for all features that failed to load.
+
+        """
+        try:
+            interpreter = self.interpreter
+        except ValueError as error:
+            return [unicode(error)]
+        processes = self.env.config.emacs_lisp_prefetch_processes
+        if processes:
+            self.start_prefetch(features, processes)
+        errors = []
+        for feature in features:
+            try:
+                interpreter.require(feature)
+            except LookupError as error:
+                errors.append(unicode(error))
+        return errors
 
-        self.interpreter = lisp.AbstractInterpreter(
-            build_env.config.emacs_lisp_load_path,
-            env=interpreter_env)
-        self.data['environment'] = self.interpreter.env
+    def merge_domaindata(self, docnames, otherdata):
+        """Merge the domain data of ``docnames`` from ``otherdata``.
+
+        Warn about symbols described in this data and in ``otherdata``, like
+        for duplicate descriptions in the same build.
+
+        """
+        docnames = set(docnames)
+        namespace = self.data['namespace']
+        for name, scopes in otherdata['namespace'].iteritems():
+            for scope, (docname, objtype) in scopes.iteritems():
+                if docname not in docnames:
+                    continue
+                symbol_scopes = namespace.setdefault(name, {})
+                if (scope in symbol_scopes and
+                        symbol_scopes[scope][0] != docname):
+                    self.env.warn(docname,
+                                  'duplicate object description of ' + name +
+                                  ', other instance in ' +
+                                  self.env.doc2path(symbol_scopes[scope][0]))
+                symbol_scopes[scope] = (docname, objtype)
+        for name, consumers in otherdata['consumers'].iteritems():
+            self.data['consumers'].setdefault(name, set()).update(
+                consumers & docnames)
+        self.data['features'].update(otherdata['features'])
+        if otherdata['environment'] is not None:
+            self.environment.merge(otherdata['environment'])
+        self.data['merged'].update(docnames)
+        self.index_groups = None
+
+    def clear_merged_data(self):
+        """Clear all data merged with :meth:`merge_domaindata`."""
+        for docname in list(self.data['merged']):
+            self.clear_doc(docname)
 
     def clear_doc(self, docname):
         namespace = self.data['namespace']
@@ -114,6 +333,55 @@ class EmacsLispDomain(Domain):
             for scope, (object_docname, _) in scopes.items():
                 if docname == object_docname:
                     del namespace[symbol][scope]
+        for docnames in self.data['consumers'].itervalues():
+            docnames.discard(docname)
+        self.data['merged'].discard(docname)
+        self.index_groups = None
+
+    def get_builtin_inventory(self, builder):
+        """Get the inventory of built-in symbols.
+
+        Load the inventory from ``emacs_lisp_builtin_inventory``, relative to
+        the configuration directory, on first use.
+
+        Return the :class:`~sphinxcontrib.emacs.inventory.Inventory`, or
+        ``None``, if no inventory is configured or it failed to load.
+
+        """
+        filename = self.env.config.emacs_lisp_builtin_inventory
+        if (filename and self.builtin_inventory is None and
+                not self.builtin_inventory_failed):
+            from sphinxcontrib.emacs.inventory import load_inventory
+            try:
+                self.builtin_inventory = load_inventory(
+                    os.path.join(builder.app.confdir, filename))
+            except (IOError, OSError) as error:
+                self.env.warn(None, 'Cannot load built-in inventory: '
+                              '{0}'.format(error))
+                # Do not try again, and do not warn again, during this build
+                self.builtin_inventory_failed = True
+        return self.builtin_inventory
+
+    def resolve_builtin(self, builder, scopes, target, content):
+        """Resolve a reference to a built-in symbol.
+
+        Look up the symbol ``target`` in the first of ``scopes`` in which it is
+        present in the inventory of built-in symbols.
+
+        Return a reference node with ``content``, or ``None``, if ``target``
+        is no built-in symbol.
+
+        """
+        inventory = self.get_builtin_inventory(builder)
+        if inventory is None:
+            return None
+        from sphinxcontrib.emacs.inventory import make_builtin_reference
+        for scope in scopes:
+            builtin_target = inventory.lookup(target, scope)
+            if builtin_target:
+                return make_builtin_reference(builder, builtin_target,
+                                              content)
+        return None
 
     def resolve_xref(self, env, fromdoc, builder, # pylint: disable=R0913
                      objtype, target, node, content):
@@ -123,6 +391,10 @@ class EmacsLispDomain(Domain):
             candidate_scopes = [s for s in ['function', 'variable']
                                 if s in target_scopes]
             if not candidate_scopes:
+                builtin = self.resolve_builtin(
+                    builder, ['function', 'variable'], target, content)
+                if builtin is not None:
+                    return builtin
                 # The reference does not refer to a defined symbol, so do not
                 # consider as reference at all.  This is quite different from
                 # how missing references are normally handled in Sphinx, but we
@@ -143,16 +415,100 @@ class EmacsLispDomain(Domain):
             obj_scope = self.object_types[objtype].attrs['scope']
 
         if obj_scope not in target_scopes:
-            # The symbol is not present in the scope of this reference
-            return None
+            # The symbol is not present in the scope of this reference, but
+            # may still be a built-in symbol
+            return self.resolve_builtin(builder, [obj_scope], target, content)
         todoc, _ = target_scopes[obj_scope]
         return make_refnode(
             builder, fromdoc, todoc, make_target(obj_scope, target),
             content, target)
 
     def get_objects(self):
+        # Keep symbols out of the general search index, if they have their own
+        separate_index = self.env.config.emacs_lisp_search_index
         for symbol, scopes in self.data['namespace'].iteritems():
             for scope, (docname, objtype) in scopes.iteritems():
+                searchprio = (-1 if separate_index else
+                              self.object_types[objtype].attrs['searchprio'])
                 yield (symbol, symbol, objtype, docname,
-                       make_target(scope, symbol),
-                       self.object_types[objtype].attrs['searchprio'])
+                       make_target(scope, symbol), searchprio)
+
+
+def get_outdated_docs(app, env, _added, _changed, _removed):
+    """Get all documents affected by changes to Emacs Lisp libraries.
+
+    Re-evaluate all outdated libraries, and return the documents which
+    consumed any symbol whose definition changed.
+
+    """
+    return env.domains[EmacsLispDomain.name].refresh_environment()
+
+
+def prefetch_features(_app, env, added, changed, _removed):
+    """Parse all libraries required by outdated documents in the background.
+
+    Only has an effect if ``emacs_lisp_prefetch_processes`` is set to the
+    number of processes to parse libraries in.
+
+    """
+    processes = env.config.emacs_lisp_prefetch_processes
+    if processes:
+        from sphinxcontrib.emacs.scanner import find_required_features
+        features = find_required_features(
+            env.doc2path(docname) for docname in added | changed)
+        env.domains[EmacsLispDomain.name].start_prefetch(features, processes)
+    return []
+
+
+def finish_prefetch(_app, env):
+    """Stop parsing libraries in the background after reading documents."""
+    env.domains[EmacsLispDomain.name].finish_prefetch()
+
+
+def preload_features(app):
+    """Load Emacs Lisp features before any document is read.
+
+    If ``emacs_lisp_preload`` is a list, load all features in this list.  If
+    it is ``True``, load all features required by any document in the
+    project.
+
+    Documents read later, in this process or in forked worker processes, find
+    all features already provided.
+
+    """
+    preload = app.config.emacs_lisp_preload
+    if not preload:
+        return
+    env = app.env
+    if preload is True:
+        from sphinxcontrib.emacs.scanner import find_required_features
+        preload = find_required_features(
+            env.doc2path(docname) for docname in sorted(env.found_docs))
+    for error in env.domains[EmacsLispDomain.name].preload(preload):
+        app.warn(error)
+
+
+def report_memory_usage(app, exception):
+    """Log the memory used by the interpreter environment.
+
+    Only has an effect if ``emacs_lisp_report_memory`` is set.
+
+    """
+    if exception or not app.config.emacs_lisp_report_memory:
+        return
+    interpreter_env = app.env.domaindata[EmacsLispDomain.name]['environment']
+    if interpreter_env is None:
+        return
+    usage = interpreter_env.memory_usage()
+    app.info('Emacs Lisp environment: approximately {0} KiB'.format(
+        usage.total // 1024))
+    for title, sizes in [('feature', usage.features),
+                         ('scope', usage.scopes),
+                         ('property', usage.properties)]:
+        app.info('  by {0}:'.format(title))
+        for size, name in sorted(((size, name) for name, size
+                                  in sizes.iteritems()), reverse=True):
+            app.info('    {0}: {1} KiB'.format(name, size // 1024))
+    app.info('  largest symbols:')
+    for size, name in usage.largest:
+        app.info('    {0}: {1} KiB'.format(name, size // 1024))
@@ -0,0 +1,190 @@
+# -*- coding: utf-8; -*-
+# Copyright (c) 2014 Sebastian Wiesner <lunaryorn@gmail.com>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+"""Extract symbol definitions from Emacs Lisp libraries.
+
+Run the abstract interpreter over a set of features, and stream all symbols
+as JSON Lines, without building any documentation.
+
+"""
+
+
+import os
+import sys
+import json
+from argparse import ArgumentParser
+from multiprocessing import Pool
+
+import sexpdata
+
+from sphinxcontrib.emacs.lisp import AbstractInterpreter, Symbol
+
+
+def decode(value):
+    """Decode ``value``, if it is a byte string.
+
+    Libraries are read as bytes, so docstrings and names are byte strings in
+    the encoding of the library.  Decode them as UTF-8, and replace all bytes
+    which are no valid UTF-8.
+
+    """
+    if isinstance(value, str):
+        return value.decode('utf-8', 'replace')
+    return value
+
+
+def error_message(error):
+    """Get the message of ``error`` as unicode string."""
+    try:
+        return unicode(error)
+    except UnicodeDecodeError:
+        return decode(str(error))
+
+
+def value_to_json(value):
+    """Convert a symbol property ``value`` into a JSON value."""
+    if isinstance(value, Symbol):
+        return decode(value.name)
+    elif isinstance(value, sexpdata.Symbol):
+        return decode(value.value())
+    elif isinstance(value, basestring):
+        return decode(value)
+    elif isinstance(value, (list, tuple)):
+        return [value_to_json(v) for v in value]
+    elif value is None or isinstance(value, (bool, int, long, float)):
+        return value
+    else:
+        return unicode(value)
+
+
+def symbol_to_json(symbol):
+    """Convert ``symbol`` into a JSON object."""
+    return {
+        'name': decode(symbol.name),
+        'scopes': dict((scope, dict((key, value_to_json(value))
+                                    for key, value in
+                                    source._asdict().iteritems()))
+                       for scope, source in symbol.scopes.iteritems()),
+        'properties': dict((key, value_to_json(value))
+                           for key, value in symbol.properties.iteritems()),
+    }
+
+
+def extract_feature(args):
+    """Extract all symbols of a feature.
+
+    ``args`` is a pair ``(load_path, feature)``.
+
+    Return a pair ``(feature, records)``, where ``records`` is a list of JSON
+    objects of all symbols defined by ``feature``, or ``(feature, error)``
+    where ``error`` is a string, if the feature failed to load.
+
+    """
+    load_path, feature = args
+    interpreter = AbstractInterpreter(load_path)
+    try:
+        interpreter.require(feature)
+    except Exception as error:  # pylint: disable=W0703
+        return feature, error_message(error)
+    # Definitions are attributed to the feature named like their library,
+    # so match by the file that provides ``feature``.
+    filename = interpreter.env.features[feature].filename
+    records = [symbol_to_json(symbol)
+               for symbol in interpreter.env.top_level.itervalues()
+               if any(source.file == filename
+                      for source in symbol.scopes.itervalues())]
+    return feature, records
+
+
+def find_features(load_path):
+    """Find all features in ``load_path``.
+
+    Return a sorted list of the names of all libraries in ``load_path``.
+
+    """
+    return sorted(set(os.path.splitext(filename)[0]
+                      for directory in load_path
+                      for filename in os.listdir(directory)
+                      if filename.endswith('.el')))
+
+
+def extract(load_path, features, jobs=1):
+    """Extract the symbols of ``features`` from ``load_path``.
+
+    ``jobs`` is the number of worker processes.  Features are extracted in
+    parallel, if more than one job is given.
+
+    Return a generator over the results of :func:`extract_feature`, in order
+    of completion.
+
+    """
+    tasks = [(load_path, feature) for feature in features]
+    if jobs > 1:
+        pool = Pool(jobs)
+        try:
+            for result in pool.imap_unordered(extract_feature, tasks):
+                yield result
+        finally:
+            pool.terminate()
+    else:
+        for task in tasks:
+            yield extract_feature(task)
+
+
+def main(argv=None):
+    """Entry point of ``sphinx-emacs-extract``."""
+    parser = ArgumentParser(
+        description='Extract Emacs Lisp symbols as JSON Lines.')
+    parser.add_argument('features', nargs='*', metavar='FEATURE',
+                        help='Features to extract (default: all libraries '
+                        'in the load path)')
+    parser.add_argument('-L', dest='load_path', action='append',
+                        required=True, metavar='DIRECTORY',
+                        help='Add DIRECTORY to the load path')
+    parser.add_argument('-j', dest='jobs', type=int, default=1,
+                        help='Number of worker processes (default: 1)')
+    args = parser.parse_args(argv)
+
+    features = args.features or find_features(args.load_path)
+    status = 0
+    for feature, records in extract(args.load_path, features, args.jobs):
+        if not isinstance(records, basestring):
+            try:
+                lines = [json.dumps(record, sort_keys=True)
+                         for record in records]
+            except (TypeError, ValueError) as error:
+                records = error_message(error)
+        if isinstance(records, basestring):
+            message = u'{0}: {1}\n'.format(decode(feature), records)
+            sys.stderr.write(message.encode('utf-8'))
+            status = 1
+            continue
+        for line in lines:
+            sys.stdout.write(line)
+            sys.stdout.write('\n')
+        sys.stdout.flush()
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
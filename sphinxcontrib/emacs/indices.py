@@ -0,0 +1,167 @@
+# -*- coding: utf-8; -*-
+# Copyright (c) 2014 Sebastian Wiesner <lunaryorn@gmail.com>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+"""Indices of the Emacs Lisp domain.
+
+Instead of a single huge index, symbols are indexed by their initial character,
+as returned by :func:`~sphinxcontrib.emacs.util.symbol_initial`, on pages of at
+most :data:`MAX_PAGE_ENTRIES` entries each.  An overview index links to all
+these pages.
+
+"""
+
+
+from sphinx.domains import Index
+
+from sphinxcontrib.emacs.util import make_target, SYMBOL_INITIALS
+
+
+#: The maximum number of entries on a single index page.
+MAX_PAGE_ENTRIES = 250
+
+#: Headings for the scopes of symbols, in order of appearance.
+SCOPE_HEADINGS = [
+    ('function', 'Functions'),
+    ('variable', 'Variables'),
+    ('face', 'Faces'),
+    ('struct', 'CL structs'),
+]
+
+
+def initial_title(initial):
+    """Get the title for symbols starting with ``initial``."""
+    return 'Symbols' if initial == '_' else initial.upper()
+
+
+def paginate(symbols, size=MAX_PAGE_ENTRIES):
+    """Split the list of ``symbols`` into pages of at most ``size`` entries.
+
+    Return a list of lists.
+
+    """
+    return [symbols[start:start + size]
+            for start in xrange(0, len(symbols), size)]
+
+
+def page_title(initial, symbols, number_of_pages):
+    """Get the title of a page of ``symbols`` starting with ``initial``.
+
+    If there are several pages for ``initial``, the title contains the range
+    of symbol names on the page.
+
+    """
+    title = initial_title(initial)
+    if number_of_pages > 1 and symbols:
+        title = u'{0} ({1} \u2013 {2})'.format(title, symbols[0][0],
+                                               symbols[-1][0])
+    return title
+
+
+class EmacsLispIndex(Index):
+    """An overview over all initial indices."""
+
+    name = 'symbols'
+    localname = 'Emacs Lisp Symbol Index'
+    shortname = 'symbols'
+
+    def generate(self, docnames=None):
+        groups = self.domain.get_index_groups()
+        entries = []
+        for initial in sorted(groups):
+            pages = paginate(groups[initial])
+            for number, page in enumerate(pages, 1):
+                symbols = [symbol for symbol in page
+                           if docnames is None or symbol[2] in docnames]
+                if symbols:
+                    entries.append([
+                        page_title(initial, page, len(pages)), 0,
+                        '{0}-{1}'.format(self.domain.name,
+                                         InitialIndex.index_name(initial,
+                                                                 number)),
+                        '', '{0} symbols'.format(len(symbols)), '', ''])
+        return [('Symbols by initial', entries)], False
+
+
+class InitialIndex(Index):
+    """An index of a page of symbols with a specific initial.
+
+    Symbols are grouped by their scope.
+
+    """
+
+    initial = None
+    page = 1
+    shortname = None
+
+    @staticmethod
+    def index_name(initial, page=1):
+        """Get the name of the index for ``page`` of ``initial``."""
+        name = 'symbols-' + initial
+        return name if page == 1 else '{0}-{1}'.format(name, page)
+
+    @classmethod
+    def for_initial(cls, initial, page=1):
+        """Create an index class for ``page`` of symbols with ``initial``."""
+        return type(str('InitialIndex_{0}_{1}'.format(initial, page)), (cls,),
+                    dict(name=cls.index_name(initial, page), initial=initial,
+                         page=page,
+                         localname='Emacs Lisp Symbols: ' +
+                         initial_title(initial)))
+
+    def generate(self, docnames=None):
+        pages = paginate(self.domain.get_index_groups().get(self.initial, []))
+        symbols = pages[self.page - 1] if self.page <= len(pages) else []
+        scopes = {}
+        for name, scope, docname, objtype in symbols:
+            if docnames is None or docname in docnames:
+                scopes.setdefault(scope, []).append([
+                    name, 0, docname, make_target(scope, name),
+                    self.domain.object_types[objtype].lname, '', ''])
+        content = [(heading, scopes[scope])
+                   for scope, heading in SCOPE_HEADINGS if scope in scopes]
+        return content, False
+
+
+#: The indices of the Emacs Lisp domain, before documents are read.
+#
+# Only the first page of each initial is known in advance.  The pages actually
+# needed are added by :func:`update_indices`.
+INDICES = [EmacsLispIndex] + [InitialIndex.for_initial(initial)
+                              for initial in SYMBOL_INITIALS + '_']
+
+
+def update_indices(app, env):
+    """Add index classes for all pages of the documented symbols.
+
+    Sphinx takes the indices of a domain from its ``indices`` attribute, so
+    set the indices of the domain instance to the overview and all pages of
+    all initials, once all documents are read.
+
+    """
+    domain = env.domains['el']
+    indices = [index for index in type(domain).indices
+               if not issubclass(index, InitialIndex)]
+    for initial, symbols in sorted(domain.get_index_groups().iteritems()):
+        indices.extend(InitialIndex.for_initial(initial, page)
+                       for page in xrange(1, len(paginate(symbols)) + 1))
+    domain.indices = indices
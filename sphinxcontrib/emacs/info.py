@@ -67,25 +67,45 @@ def resolve_info_references(app, _env, refnode, contnode):
                      refnode.line)
         return contnode
 
-    manual = match.group('manual')
-    node = match.group('node')
+    reference = make_info_reference(app.builder, match.group('manual'),
+                                    match.group('node'), contnode,
+                                    refnode['has_explicit_title'])
+    if reference is None:
+        message = 'Cannot resolve info manual {0}'.format(
+            match.group('manual'))
+        app.env.warn(refnode.source, message, refnode.line)
+        return contnode
+    return reference
+
+
+def make_info_reference(builder, manual, node, contnode,
+                        has_explicit_title=True):
+    """Make a reference to ``node`` in the Info ``manual``.
+
+    If ``builder`` builds Texinfo, return a :class:`infonode_reference` node,
+    which is then processed by the Texinfo writer.  Otherwise return a
+    :class:`~docutils.nodes.reference` node to the web URL of the node, as in
+    :data:`INFO_MANUAL_URLS`.
+
+    ``contnode`` is the content node of the reference.
 
-    if app.builder.format == 'texinfo':
+    Return the reference node, or ``None``, if there is no web URL for
+    ``manual``.
+
+    """
+    if builder.format == 'texinfo':
         reference = infonode_reference('', '')
         reference['refnode'] = node
         reference['refmanual'] = manual
-        reference['has_explicit_title'] = refnode['has_explicit_title']
+        reference['has_explicit_title'] = has_explicit_title
         reference.append(contnode)
         return reference
     else:
         base_uri = INFO_MANUAL_URLS.get(manual)
         if not base_uri:
-            message = 'Cannot resolve info manual {0}'.format(manual)
-            app.env.warn(refnode.source, message, refnode.line)
-            return contnode
-        else:
-            reference = nodes.reference('', '', internal=False)
-            reference['refuri'] = base_uri.format(node=node.replace(' ', '-'))
-            reference['reftitle'] = target
-            reference.append(contnode)
-            return reference
+            return None
+        reference = nodes.reference('', '', internal=False)
+        reference['refuri'] = base_uri.format(node=node.replace(' ', '-'))
+        reference['reftitle'] = '({0}){1}'.format(manual, node)
+        reference.append(contnode)
+        return reference
@@ -0,0 +1,164 @@
+# -*- coding: utf-8; -*-
+# Copyright (c) 2014 Sebastian Wiesner <lunaryorn@gmail.com>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+"""Inventories of built-in Emacs Lisp symbols.
+
+An inventory is a local text file which maps built-in symbols of Emacs to
+their documentation.  Each line has the form::
+
+   name<TAB>scope<TAB>target
+
+where ``scope`` is ``function``, ``variable`` or ``face``, and ``target`` is
+either a URL, or an Info node such as ``(elisp)Building Lists``.  Empty lines
+and lines starting with ``#`` are ignored.
+
+Small inventories are parsed entirely into a dictionary.  Large inventories
+are memory-mapped, and only an index from symbol names to line offsets is
+kept in memory.
+
+"""
+
+
+import os
+import mmap
+
+from docutils import nodes
+
+from sphinxcontrib.emacs.info import INFO_RE, make_info_reference
+
+
+#: Inventories larger than this number of bytes are memory-mapped.
+MMAP_THRESHOLD = 4 * 1024 * 1024
+
+
+def parse_line(line):
+    """Parse a single ``line`` of an inventory.
+
+    ``line`` is a byte string.  Return a triple ``(name, scope, target)``, or
+    ``None``, if ``line`` is empty, a comment, or malformed.
+
+    """
+    line = line.strip()
+    if not line or line.startswith(b'#'):
+        return None
+    parts = line.decode('utf-8').split('\t')
+    return tuple(parts) if len(parts) == 3 else None
+
+
+class Inventory(object):
+    """An inventory of built-in symbols.
+
+    Use :meth:`lookup` to get the documentation target of a symbol.
+
+    """
+
+    def __init__(self, filename):
+        """Load the inventory from ``filename``."""
+        self.filename = filename
+        self.mapped = None
+        self.entries = {}
+        self.offsets = {}
+        with open(filename, 'rb') as source:
+            if os.path.getsize(filename) > MMAP_THRESHOLD:
+                self.mapped = mmap.mmap(source.fileno(), 0,
+                                        access=mmap.ACCESS_READ)
+                self._index_mapped()
+            else:
+                for line in source:
+                    entry = parse_line(line)
+                    if entry:
+                        name, scope, target = entry
+                        self.entries.setdefault(name, {})[scope] = target
+
+    def _index_mapped(self):
+        """Index the line offsets of all symbols in the mapped file."""
+        offset = 0
+        while True:
+            end = self.mapped.find(b'\n', offset)
+            line = self.mapped[offset:end if end >= 0 else len(self.mapped)]
+            name = line.split(b'\t', 1)[0].strip()
+            if name and not name.startswith(b'#'):
+                self.offsets.setdefault(name.decode('utf-8'), []).append(
+                    offset)
+            if end < 0:
+                break
+            offset = end + 1
+
+    def _read_mapped(self, name):
+        """Read the targets of ``name`` from the mapped file."""
+        targets = {}
+        for offset in self.offsets.get(name, []):
+            end = self.mapped.find(b'\n', offset)
+            entry = parse_line(
+                self.mapped[offset:end if end >= 0 else len(self.mapped)])
+            if entry:
+                targets[entry[1]] = entry[2]
+        return targets
+
+    def lookup(self, name, scope):
+        """Get the documentation target of the symbol ``name`` in ``scope``.
+
+        Return the target as string, or ``None`` if the symbol is not in this
+        inventory.
+
+        """
+        if self.mapped is not None:
+            return self._read_mapped(name).get(scope)
+        return self.entries.get(name, {}).get(scope)
+
+
+#: Cache of loaded inventories, by file name
+_INVENTORIES = {}
+
+
+def load_inventory(filename):
+    """Load the inventory at ``filename``.
+
+    Every inventory is only loaded once per process.
+
+    Return the :class:`Inventory`.
+
+    """
+    filename = os.path.abspath(filename)
+    inventory = _INVENTORIES.get(filename)
+    if inventory is None:
+        inventory = _INVENTORIES[filename] = Inventory(filename)
+    return inventory
+
+
+def make_builtin_reference(builder, target, contnode):
+    """Make a reference node to the documentation ``target`` of a built-in.
+
+    ``target`` is either a URL, or an Info node.
+
+    Return the reference node, or ``None``, if ``target`` cannot be resolved.
+
+    """
+    match = INFO_RE.match(target)
+    if match:
+        return make_info_reference(builder, match.group('manual'),
+                                   match.group('node'), contnode)
+    reference = nodes.reference('', '', internal=False)
+    reference['refuri'] = target
+    reference.append(contnode)
+    return reference
@@ -0,0 +1,193 @@
+# -*- coding: utf-8; -*-
+# Copyright (c) 2014 Sebastian Wiesner <lunaryorn@gmail.com>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""Per-symbol JSON output for editors and other tools.
+
+The JSON builder writes one compact JSON record per described Emacs Lisp
+symbol, with the signatures, the rendered documentation as plain text, the
+symbol properties and the URL of the description.  Records are written while
+writing each document, so memory does not grow with the number of symbols.
+
+A sorted manifest lists all records, for lookup by binary search.  Records
+of symbols which are not in the manifest are removed after writing, so that
+the record files always match the manifest.
+
+"""
+
+
+import os
+import json
+from urllib import quote
+
+from sphinx import addnodes
+from sphinx.builders import Builder
+from sphinx.util.osutil import ensuredir
+
+
+#: The directory of per-symbol records in the output directory.
+RECORDS_DIR = 'symbols'
+
+#: The file name of the manifest in the output directory.
+MANIFEST = 'el-symbols.json'
+
+
+def record_path(scope, name):
+    """Get the path of the record of ``name`` in ``scope``.
+
+    The path is relative to the output directory, with forward slashes.
+
+    """
+    if isinstance(name, unicode):
+        name = name.encode('utf-8')
+    return '/'.join([RECORDS_DIR, scope, quote(name, safe='') + '.json'])
+
+
+def scope_properties(symbol, scope):
+    """Get the properties of ``symbol`` which belong to ``scope``.
+
+    Leave out documentation properties, since the documentation is part of the
+    record already.
+
+    Return a dictionary of JSON values.
+
+    """
+    from sphinxcontrib.emacs.lisp import SCOPE_PROPERTIES
+    from sphinxcontrib.emacs.extract import value_to_json
+    return dict((key, value_to_json(symbol.properties[key]))
+                for key in SCOPE_PROPERTIES.get(scope, [])
+                if key in symbol.properties
+                and not key.endswith('-documentation'))
+
+
+class EmacsLispJSONBuilder(Builder):
+    """Write a JSON record for every described Emacs Lisp symbol."""
+
+    name = 'el-json'
+
+    def get_outdated_docs(self):
+        domain = self.env.domains['el']
+        return sorted(set(docname for _, _, _, docname, _, _
+                          in domain.get_objects()))
+
+    def get_target_uri(self, docname, typ=None):
+        return docname + (self.config.html_file_suffix or '.html')
+
+    def manifest_entries(self):
+        """Get the entries of the manifest.
+
+        Return a sorted list of ``(name, scope, objtype, docname)`` tuples.
+
+        """
+        domain = self.env.domains['el']
+        return sorted(set(
+            (name, target.split('.', 2)[1], objtype, docname)
+            for name, _, objtype, docname, target, _ in domain.get_objects()))
+
+    def prepare_writing(self, docnames):
+        ensuredir(os.path.join(self.outdir, RECORDS_DIR))
+        self.record_paths = set(record_path(scope, name) for name, scope, _, _
+                                in self.manifest_entries())
+
+    def write_doc(self, docname, doctree):
+        for desc in doctree.traverse(addnodes.desc):
+            if desc.get('domain') != 'el':
+                continue
+            for record in self.make_records(docname, desc):
+                # Skip symbols which are not indexed, since the manifest
+                # doesn't list them
+                if record_path(record['scope'],
+                               record['name']) in self.record_paths:
+                    self.write_record(record)
+
+    def make_records(self, docname, desc):
+        """Make the records of all symbols described by ``desc``.
+
+        Return a generator over the records as dictionaries.
+
+        """
+        signatures = [child for child in desc.children
+                      if isinstance(child, addnodes.desc_signature)]
+        contents = [child for child in desc.children
+                    if isinstance(child, addnodes.desc_content)]
+        signature_texts = [signode.astext() for signode in signatures]
+        documentation = contents[0].astext() if contents else ''
+        interpreter_env = self.env.domaindata['el']['environment']
+        for signode in signatures:
+            for target in signode['ids']:
+                parts = target.split('.', 2)
+                if len(parts) != 3 or parts[0] != 'el':
+                    continue
+                _, scope, name = parts
+                symbol = (interpreter_env.top_level.get(name)
+                          if interpreter_env is not None else None)
+                yield {
+                    'name': name,
+                    'scope': scope,
+                    'objtype': desc['objtype'],
+                    'signatures': signature_texts,
+                    'documentation': documentation,
+                    'properties': (scope_properties(symbol, scope)
+                                   if symbol else {}),
+                    'url': '{0}{1}#{2}'.format(
+                        self.config.emacs_lisp_json_base_url,
+                        self.get_target_uri(docname), target),
+                }
+
+    def write_record(self, record):
+        """Write a single ``record`` to its file."""
+        filename = os.path.join(
+            self.outdir, *record_path(record['scope'],
+                                      record['name']).split('/'))
+        ensuredir(os.path.dirname(filename))
+        with open(filename, 'wb') as sink:
+            json.dump(record, sink, separators=(',', ':'), sort_keys=True)
+
+    def finish(self):
+        """Write the manifest, and remove records of undescribed symbols."""
+        entries = self.manifest_entries()
+        paths = set()
+        with open(os.path.join(self.outdir, MANIFEST), 'wb') as sink:
+            sink.write('[\n')
+            for index, (name, scope, objtype, docname) in enumerate(entries):
+                path = record_path(scope, name)
+                paths.add(path)
+                sink.write(',\n' if index else '')
+                json.dump([name, scope, objtype, path], sink,
+                          separators=(',', ':'))
+            sink.write('\n]\n')
+        self.remove_stale_records(paths)
+
+    def remove_stale_records(self, paths):
+        """Remove all records whose path is not in ``paths``.
+
+        Remove scope directories which are empty afterwards as well.
+
+        """
+        records_dir = os.path.join(self.outdir, RECORDS_DIR)
+        for directory, _, filenames in os.walk(records_dir, topdown=False):
+            for filename in filenames:
+                path = os.path.relpath(os.path.join(directory, filename),
+                                       self.outdir).replace(os.sep, '/')
+                if path not in paths:
+                    os.remove(os.path.join(directory, filename))
+            if directory != records_dir and not os.listdir(directory):
+                os.rmdir(directory)
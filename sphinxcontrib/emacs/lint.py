@@ -0,0 +1,288 @@
+# -*- coding: utf-8; -*-
+# Copyright (c) 2014 Sebastian Wiesner <lunaryorn@gmail.com>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+"""Check Emacs Lisp markup without building documentation.
+
+The checker scans all documents for Emacs Lisp directives and roles, loads all
+required and preloaded features with the abstract interpreter, and reports
+
+- ``:auto:`` descriptions of undefined symbols, of symbols not defined in the
+  scope of the description, and of symbols without docstring,
+- and references to symbols which are neither described in any document nor
+  listed in the inventory of built-in symbols.
+
+Diagnostics are written as JSON Lines.
+
+"""
+
+
+import os
+import sys
+import json
+from argparse import ArgumentParser
+
+from sphinxcontrib.emacs.domain import EmacsLispDomain
+from sphinxcontrib.emacs.extract import extract, symbol_to_json
+from sphinxcontrib.emacs.inventory import load_inventory
+from sphinxcontrib.emacs.scanner import scan_document
+from sphinxcontrib.emacs.snapshot import load_snapshot, SnapshotError
+
+
+#: Object types and roles which are not checked.
+#
+# Slots are named relative to their structure, and unresolved references to
+# plain symbols are intentionally dropped by the domain.
+UNCHECKED_TYPES = frozenset(['require', 'cl-slot', 'symbol', 'var', 'varcode'])
+
+
+class Diagnostic(dict):
+    """A diagnostic message of the checker.
+
+    A diagnostic is a dictionary with the ``file`` and ``line`` of the
+    problem, a symbolic ``code`` and a human-readable ``message``.
+
+    """
+
+    def __init__(self, filename, lineno, code, message):
+        dict.__init__(self, file=filename, line=lineno, code=code,
+                      message=message)
+
+
+def read_configuration(confdir):
+    """Read the configuration in ``confdir``.
+
+    Execute the ``conf.py`` file in ``confdir``, like Sphinx does.
+
+    Return the namespace of the configuration as dictionary.
+
+    """
+    filename = os.path.join(confdir, 'conf.py')
+    namespace = {'__file__': filename}
+    current_dir = os.getcwd()
+    os.chdir(confdir)
+    try:
+        execfile(filename, namespace)    # pylint: disable=W0122
+    finally:
+        os.chdir(current_dir)
+    return namespace
+
+
+def find_documents(srcdir, suffix):
+    """Find all documents with ``suffix`` in ``srcdir``.
+
+    ``suffix`` is a tuple of file name suffixes.
+
+    """
+    for dirpath, dirnames, filenames in os.walk(srcdir):
+        dirnames[:] = [d for d in dirnames if not d.startswith(('.', '_'))]
+        for filename in filenames:
+            if filename.endswith(suffix):
+                yield os.path.join(dirpath, filename)
+
+
+class Checker(object):
+    """Check the Emacs Lisp markup of a set of documents."""
+
+    def __init__(self, load_path, inventory=None, jobs=1, preload=None,
+                 environment=None):
+        """Create a new checker.
+
+        ``load_path`` is the load path for features, ``inventory`` an optional
+        :class:`~sphinxcontrib.emacs.inventory.Inventory` of built-in symbols,
+        and ``jobs`` the number of processes to load features in.
+
+        ``preload`` is a list of features to load in addition to all required
+        features, like ``emacs_lisp_preload``.  ``environment`` is an optional
+        :class:`~sphinxcontrib.emacs.lisp.AbstractEnvironment` to start from,
+        as loaded from a snapshot.  Its features are not loaded again.
+
+        """
+        self.load_path = load_path
+        self.inventory = inventory
+        self.jobs = jobs
+        self.preload = preload or []
+        self.environment = environment
+        self.object_types = EmacsLispDomain.object_types
+        self.directives = EmacsLispDomain.directives
+
+    def load_symbols(self, features, diagnostics):
+        """Load all ``features`` and return their symbols.
+
+        Return a dictionary mapping symbol names to JSON objects, as returned
+        by :func:`~sphinxcontrib.emacs.extract.symbol_to_json`.  Append a
+        diagnostic to ``diagnostics`` for each feature that failed to load.
+
+        """
+        symbols = {}
+        if self.environment is not None:
+            for symbol in self.environment.top_level.itervalues():
+                symbols[symbol.name] = symbol_to_json(symbol)
+            features = [f for f in features
+                        if f not in self.environment.features]
+        for feature, records in extract(self.load_path, features, self.jobs):
+            if isinstance(records, basestring):
+                diagnostics.append(Diagnostic(None, None, 'load-error',
+                                              '{0}: {1}'.format(feature,
+                                                                records)))
+                continue
+            for record in records:
+                symbol = symbols.setdefault(record['name'], {
+                    'scopes': {}, 'properties': {}})
+                symbol['scopes'].update(record['scopes'])
+                symbol['properties'].update(record['properties'])
+        return symbols
+
+    def check_description(self, filename, description, symbols):
+        """Check an ``:auto:`` ``description`` against ``symbols``.
+
+        Return a diagnostic, or ``None`` if the description is fine.
+
+        """
+        name = description.name
+        scope = self.object_types[description.objtype].attrs['scope']
+        symbol = symbols.get(name)
+
+        def diagnostic(code, message):
+            """Make a diagnostic for this description."""
+            return Diagnostic(filename, description.lineno, code, message)
+
+        if symbol is None:
+            return diagnostic('undefined-symbol',
+                              'Undefined symbol {0}'.format(name))
+        if scope not in symbol['scopes']:
+            return diagnostic('wrong-scope',
+                              'Symbol {0} not present in scope {1}'.format(
+                                  name, scope))
+        docstring_property = self.directives[
+            description.objtype].docstring_property
+        if not symbol['properties'].get(docstring_property):
+            return diagnostic('missing-docstring',
+                              'no docstring for symbol {0}'.format(name))
+        return None
+
+    def check_reference(self, filename, reference, described):
+        """Check a ``reference`` against the ``described`` symbols.
+
+        ``described`` is a set of ``(name, scope)`` pairs of all described
+        symbols.
+
+        Return a diagnostic, or ``None`` if the reference resolves.
+
+        """
+        scope = self.object_types[reference.role].attrs['scope']
+        if (reference.target, scope) in described:
+            return None
+        if (self.inventory and
+                self.inventory.lookup(reference.target, scope)):
+            return None
+        return Diagnostic(filename, reference.lineno, 'unresolved-reference',
+                          'Unresolved reference to {0} {1}'.format(
+                              reference.role, reference.target))
+
+    def check(self, filenames):
+        """Check all documents at ``filenames``.
+
+        Return a list of :class:`Diagnostic` objects.
+
+        """
+        diagnostics = []
+        scanned = [(filename, scan_document(filename))
+                   for filename in filenames]
+        # Preloaded features are loaded before any document is read, just
+        # like during a build.  ``True`` preloads all required features,
+        # which are loaded anyway.
+        features = [] if self.preload is True else list(self.preload)
+        described = set()
+        for _, (descriptions, _) in scanned:
+            for description in descriptions:
+                if description.objtype == 'require':
+                    if description.name not in features:
+                        features.append(description.name)
+                elif description.objtype in self.object_types:
+                    scope = self.object_types[
+                        description.objtype].attrs['scope']
+                    described.add((description.name, scope))
+        symbols = self.load_symbols(features, diagnostics)
+        for filename, (descriptions, references) in scanned:
+            for description in descriptions:
+                if ('auto' in description.options and
+                        description.objtype not in UNCHECKED_TYPES and
+                        description.objtype in self.object_types):
+                    diagnostics.append(self.check_description(
+                        filename, description, symbols))
+            for reference in references:
+                if (reference.role not in UNCHECKED_TYPES and
+                        reference.role in self.object_types):
+                    diagnostics.append(self.check_reference(
+                        filename, reference, described))
+        return [d for d in diagnostics if d is not None]
+
+
+def main(argv=None):
+    """Entry point of ``sphinx-emacs-lint``."""
+    parser = ArgumentParser(
+        description='Check Emacs Lisp markup in documentation sources.')
+    parser.add_argument('sourcedir', help='Directory with document sources')
+    parser.add_argument('-c', dest='confdir',
+                        help='Directory with conf.py (default: sourcedir)')
+    parser.add_argument('-L', dest='load_path', action='append',
+                        metavar='DIRECTORY',
+                        help='Add DIRECTORY to the load path (default: '
+                        'emacs_lisp_load_path from conf.py)')
+    parser.add_argument('-j', dest='jobs', type=int, default=1,
+                        help='Number of processes to load features in '
+                        '(default: 1)')
+    args = parser.parse_args(argv)
+
+    confdir = os.path.abspath(args.confdir or args.sourcedir)
+    config = read_configuration(confdir)
+    load_path = args.load_path or config.get('emacs_lisp_load_path', [])
+    inventory_file = config.get('emacs_lisp_builtin_inventory')
+    inventory = (load_inventory(os.path.join(confdir, inventory_file))
+                 if inventory_file else None)
+    suffix = config.get('source_suffix', '.rst')
+    if isinstance(suffix, basestring):
+        suffix = [suffix]
+
+    environment = None
+    snapshot = config.get('emacs_lisp_snapshot')
+    if snapshot:
+        try:
+            environment = load_snapshot(os.path.join(confdir, snapshot),
+                                        load_path)
+        except (IOError, OSError, SnapshotError) as error:
+            sys.stderr.write('Cannot use snapshot {0}: {1}\n'.format(
+                snapshot, error))
+
+    checker = Checker(load_path, inventory=inventory, jobs=args.jobs,
+                      preload=config.get('emacs_lisp_preload'),
+                      environment=environment)
+    diagnostics = checker.check(find_documents(args.sourcedir, tuple(suffix)))
+    for diagnostic in diagnostics:
+        sys.stdout.write(json.dumps(diagnostic, sort_keys=True))
+        sys.stdout.write('\n')
+    return 1 if diagnostics else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -25,12 +25,16 @@
 
 import os
 import os.path
+import sys
+import hashlib
 from collections import namedtuple
 from contextlib import contextmanager
 
 import sexpdata
 
 from sphinxcontrib.emacs.lisp import util as lisputil
+from sphinxcontrib.emacs.lisp import keymap
+from sphinxcontrib.emacs.lisp.reader import split_forms
 
 
 def strip_broken_function_quotes(sexp):
@@ -51,15 +55,82 @@ def strip_broken_function_quotes(sexp):
         return sexp
 
 
-class Source(namedtuple('_Source', 'file feature')):
+class Form(namedtuple('_Form', 'sexp start end digest')):
+    """A parsed top-level form.
+
+    ``sexp`` is the expression of the form, and ``start`` and ``end`` are the
+    first and the last line of the form in its library, starting at 1.
+    ``digest`` is the digest of the text of the form.
+
+    """
+
+    @classmethod
+    def from_text(cls, text):
+        """Parse a :class:`~sphinxcontrib.emacs.lisp.reader.FormText`."""
+        return cls(sexpdata.loads(text.text), text.start, text.end,
+                   text.digest)
+
+
+class FormRecord(namedtuple('_FormRecord', 'digest definitions properties '
+                                             'bindings provides')):
+    """The record of an evaluated top-level form.
+
+    ``digest`` is the digest of the text of the form, ``definitions`` a list
+    of ``(name, scope)`` pairs of all definitions made by the form,
+    ``properties`` a list of ``(name, property)`` pairs of all symbol
+    properties set by ``put`` in the form, ``bindings`` a list of all
+    :class:`~sphinxcontrib.emacs.lisp.keymap.KeyBinding` objects made by the
+    form, and ``provides`` a list of the names of all features provided by
+    the form.
+
+    """
+    pass
+
+
+def library_feature(filename):
+    """Get the name of the feature of the library ``filename``.
+
+    Definitions from a library are attributed to the feature named like the
+    library, whichever feature the library was loaded for, and whichever
+    features it provides.
+
+    """
+    return os.path.splitext(os.path.basename(filename))[0]
+
+
+def read_forms(filename):
+    """Split the library ``filename`` into top-level forms, without parsing.
+
+    Return a list of :class:`~sphinxcontrib.emacs.lisp.reader.FormText`
+    objects.
+
+    """
+    with open(filename, 'r') as source:
+        return list(split_forms(source.read()))
+
+
+def parse_library(filename):
+    """Parse all top-level forms from the library ``filename``.
+
+    Return a list of :class:`Form` objects.
+
+    """
+    return [Form.from_text(text) for text in read_forms(filename)]
+
+
+class Source(namedtuple('_Source', 'file feature lines')):
     """The source of a definition.
 
     The ``file`` attribute is the name of the file, that contained the
     definition.  The ``feature`` is the name of the feature that provided the
-    definition.  Both are either strings or ``None``.
+    definition.  Both are either strings or ``None``.  ``lines`` is a pair of
+    the first and the last line of the definition in ``file``, or ``None``.
 
     """
 
+    def __new__(cls, file, feature, lines=None):
+        return super(Source, cls).__new__(cls, file, feature, lines)
+
     @property
     def empty(self):
         """Whether this source is empty."""
@@ -117,28 +188,151 @@ class Symbol(object):
         """
         return self.scopes.get(scope)
 
+    @property
+    def state(self):
+        """The current definition state of this symbol.
+
+        A pair ``(scopes, properties)`` with copies of the scopes and
+        properties of this symbol.  Compare states to determine whether the
+        definitions of a symbol changed.
+
+        The line spans of the sources are not part of the state, so moving a
+        definition within its library does not change the state.
+
+        """
+        scopes = dict((scope, source._replace(lines=None))
+                      for scope, source in self.scopes.iteritems())
+        return scopes, dict(self.properties)
+
 
-class Feature(namedtuple('_Feature', 'name filename load_time')):
+#: Symbol properties which belong to the definition in a scope.
+SCOPE_PROPERTIES = {
+    'function': ['function-arglist', 'function-documentation'],
+    'variable': ['variable-documentation', 'buffer-local', 'user-option',
+                 'custom-package-version', 'safe-local-variable',
+                 'risky-local-variable'],
+    'face': ['face-documentation', 'custom-package-version'],
+}
+
+
+def file_digest(filename):
+    """Compute the SHA1 digest of the contents of ``filename``.
+
+    Return the hex digest as string.
+
+    """
+    digest = hashlib.sha1()
+    with open(filename, 'rb') as source:
+        for chunk in iter(lambda: source.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Feature(namedtuple('_Feature', 'name filename load_time size digest')):
     """A named feature.
 
     A feature has a unique ``name`` as string, an associated ``filename``, from
-    which it was loaded, and a ``load_time``, as seconds since the epoch.
+    which it was loaded, and a ``load_time``, as seconds since the epoch.  The
+    ``load_time`` is the modification time of the file when it was loaded.
+    ``size`` and ``digest`` are the size in bytes and the SHA1 digest of the
+    contents of the file.
 
     """
 
+    @classmethod
+    def from_file(cls, name, filename=None):
+        """Create a feature with ``name`` from ``filename``.
+
+        Take the load time, the size and the digest from ``filename``, if it
+        exists.
+
+        """
+        if filename and os.path.isfile(filename):
+            stat = os.stat(filename)
+            return cls(name=name, filename=filename, load_time=stat.st_mtime,
+                       size=stat.st_size, digest=file_digest(filename))
+        return cls(name=name, filename=filename, load_time=0, size=None,
+                   digest=None)
+
+    def revalidate(self):
+        """Check this feature against the file it was loaded from.
+
+        Compare size and modification time first, and only compute the digest
+        of the file if the size is the same, but the modification time
+        differs.
+
+        Return this feature, if the file is unchanged.  If only the
+        modification time of the file changed, return a copy of this feature
+        with the new modification time as ``load_time``.  If the file changed,
+        or does not exist anymore, return ``None``.
+
+        """
+        if not self.filename:
+            return self
+        try:
+            stat = os.stat(self.filename)
+        except OSError:
+            return None
+        if stat.st_size != self.size:
+            return None
+        if stat.st_mtime == self.load_time:
+            return self
+        if file_digest(self.filename) != self.digest:
+            return None
+        return self._replace(load_time=stat.st_mtime)
+
     @property
     def outdated(self):
         """Whether the feature is outdated.
 
-        A feature is outdated, if the modification time of the file it was
-        loaded from is newer than the load time of the feature.
+        A feature is outdated, if the contents of the file it was loaded from
+        changed since the feature was loaded.
 
         Use this property to determine whether ``feature`` should be loaded
         again.
 
+        .. seealso:: revalidate
+
         """
-        return (os.path.isfile(self.filename) and
-                os.path.getmtime(self.filename) <= self.load_time)
+        return self.revalidate() is None
+
+
+def approximate_size(value):
+    """Approximate the number of bytes retained by ``value``.
+
+    Recursively add the sizes of the contents of containers.  Do not descend
+    into :class:`Symbol` objects, because symbols are owned by the symbol
+    table, not by whoever refers to them.
+
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, Symbol):
+        return size
+    elif isinstance(value, dict):
+        size += sum(approximate_size(k) + approximate_size(v)
+                    for k, v in value.iteritems())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(approximate_size(v) for v in value)
+    elif hasattr(value, '__dict__'):
+        size += approximate_size(vars(value))
+    return size
+
+
+class MemoryUsage(namedtuple('_MemoryUsage', 'total features scopes '
+                             'properties largest')):
+    """The approximate memory usage of an environment.
+
+    ``total`` is the number of bytes retained by all symbols.  ``features``,
+    ``scopes`` and ``properties`` are dictionaries which map feature names,
+    scopes and property names respectively to numbers of bytes.  Symbols
+    defined by multiple features are split evenly among them.  Symbols without
+    a feature are counted under ``None``.
+
+    ``largest`` is a list of ``(size, name)`` pairs of the largest symbols,
+    in descending order of size.
+
+    """
+    pass
 
 
 class AbstractEnvironment(object):
@@ -154,10 +348,16 @@ class AbstractEnvironment(object):
 
     """
 
+    #: Whether the contents of this environment were lost and reset.
+    reset = False
+
     def __init__(self):
         """Creates an empty environment."""
         self.features = {}
         self.top_level = {}
+        # Maps file names to lists of FormRecord objects
+        self.forms = {}
+        self._key_index = None
 
     @property
     def outdated(self):
@@ -170,6 +370,252 @@ class AbstractEnvironment(object):
         """
         return any(feature.outdated for feature in self.features.itervalues())
 
+    def outdated_features(self):
+        """Find all outdated features in a single pass.
+
+        Revalidate all features, and remember the new modification time of
+        features whose file was touched, but not changed, to avoid computing
+        the digest again next time.
+
+        Return a list of all outdated :class:`Feature` objects.
+
+        .. seealso:: Feature.revalidate
+
+        """
+        outdated = []
+        for name, feature in self.features.items():
+            current = feature.revalidate()
+            if current is None:
+                outdated.append(feature)
+            else:
+                self.features[name] = current
+        return outdated
+
+    def symbols_defined_in(self, filename):
+        """Get all symbols with at least one definition from ``filename``.
+
+        Return a list of :class:`Symbol` objects.
+
+        """
+        return [symbol for symbol in self.top_level.itervalues()
+                if any(source.file == filename
+                       for source in symbol.scopes.itervalues())]
+
+    def definitions_from(self, filename):
+        """Get the state of all symbols defined in ``filename``.
+
+        Return a dictionary mapping symbol names to the
+        :attr:`Symbol.state` of all symbols with at least one definition from
+        ``filename``.
+
+        """
+        return dict((symbol.name, symbol.state)
+                    for symbol in self.symbols_defined_in(filename))
+
+    def retract(self, filename):
+        """Retract all definitions from ``filename``.
+
+        Remove all scopes defined in ``filename`` from their symbols, together
+        with the properties of these scopes, as in :data:`SCOPE_PROPERTIES`.
+        Symbols left without any scopes and properties are removed from the
+        symbol table.
+
+        """
+        for symbol in self.symbols_defined_in(filename):
+            for scope in symbol.scopes.keys():
+                self.retract_definition(symbol.name, scope, filename)
+        self.record_forms(filename, None)
+
+    def record_forms(self, filename, records):
+        """Record the evaluated forms of ``filename``.
+
+        ``records`` is a list of :class:`FormRecord` objects, or ``None`` to
+        forget the forms of ``filename``.
+
+        """
+        if records is None:
+            self.forms.pop(filename, None)
+        else:
+            self.forms[filename] = records
+        self._key_index = None
+
+    def key_index(self):
+        """Get the index of all key bindings made in this environment.
+
+        The index is computed once from the recorded forms, and computed again
+        only after the forms changed.
+
+        Return a :class:`~sphinxcontrib.emacs.lisp.keymap.KeymapIndex`.
+
+        """
+        if getattr(self, '_key_index', None) is None:
+            self._key_index = keymap.KeymapIndex.from_forms(self.forms)
+        return self._key_index
+
+    def retract_definition(self, name, scope, filename):
+        """Retract the definition of ``name`` in ``scope`` from ``filename``.
+
+        Remove the scope and its properties from the symbol, if the scope was
+        defined in ``filename``.  If the symbol is left without any scopes and
+        properties, remove it from the symbol table.
+
+        """
+        symbol = self.top_level.get(name)
+        if symbol is None:
+            return
+        source = symbol.scopes.get(scope)
+        if source is not None and source.file == filename:
+            del symbol.scopes[scope]
+            for prop in SCOPE_PROPERTIES.get(scope, []):
+                symbol.properties.pop(prop, None)
+        if not symbol.scopes and not symbol.properties:
+            del self.top_level[name]
+
+    def retract_property(self, name, prop):
+        """Retract the property ``prop`` of the symbol ``name``.
+
+        If the symbol is left without any scopes and properties, remove it
+        from the symbol table.
+
+        """
+        symbol = self.top_level.get(name)
+        if symbol is None:
+            return
+        symbol.properties.pop(prop, None)
+        if not symbol.scopes and not symbol.properties:
+            del self.top_level[name]
+
+    def retract_record(self, filename, record):
+        """Retract all definitions and properties of a form in ``filename``.
+
+        ``record`` is the :class:`FormRecord` of the form.
+
+        """
+        for name, scope in record.definitions:
+            self.retract_definition(name, scope, filename)
+        for name, prop in record.properties:
+            self.retract_property(name, prop)
+
+    def move_definitions(self, filename, definitions, lines):
+        """Move ``definitions`` from ``filename`` to new ``lines``.
+
+        ``definitions`` is a list of ``(name, scope)`` pairs, and ``lines`` the
+        new line span of the definitions in ``filename``.
+
+        Return a set with the names of all symbols whose definitions moved.
+
+        """
+        moved = set()
+        for name, scope in definitions:
+            symbol = self.top_level.get(name)
+            source = symbol.scopes.get(scope) if symbol else None
+            if source and source.file == filename and source.lines != lines:
+                symbol.scopes[scope] = source._replace(lines=lines)
+                moved.add(name)
+        return moved
+
+    def resident_symbols(self):
+        """Get all symbols held in memory by this environment."""
+        return self.top_level.itervalues()
+
+    def memory_usage(self, largest=10):
+        """Approximate the memory used by this environment.
+
+        Only account for symbols held in memory, as returned by
+        :meth:`resident_symbols`.  ``largest`` is the number of largest
+        symbols to report.
+
+        Return a :class:`MemoryUsage` object.
+
+        """
+        total = 0
+        by_feature = {}
+        by_scope = {}
+        by_property = {}
+        sizes = []
+        for symbol in self.resident_symbols():
+            for scope, source in symbol.scopes.iteritems():
+                by_scope[scope] = (by_scope.get(scope, 0) +
+                                   approximate_size(source))
+            property_sizes = dict(
+                (key, approximate_size(value))
+                for key, value in symbol.properties.iteritems())
+            for key, value_size in property_sizes.iteritems():
+                by_property[key] = by_property.get(key, 0) + value_size
+                for scope, keys in SCOPE_PROPERTIES.iteritems():
+                    if key in keys and scope in symbol.scopes:
+                        by_scope[scope] += value_size
+            size = (sys.getsizeof(symbol) + approximate_size(symbol.name) +
+                    approximate_size(symbol.scopes) +
+                    sys.getsizeof(symbol.properties) +
+                    sum(approximate_size(key) + value_size
+                        for key, value_size in property_sizes.iteritems()))
+            features = set(source.feature
+                           for source in symbol.scopes.itervalues()) or {None}
+            for feature in features:
+                by_feature[feature] = (by_feature.get(feature, 0) +
+                                       size // len(features))
+            total += size
+            sizes.append((size, symbol.name))
+        sizes.sort(reverse=True)
+        return MemoryUsage(total=total, features=by_feature, scopes=by_scope,
+                           properties=by_property, largest=sizes[:largest])
+
+    def merge(self, other):
+        """Merge the ``other`` environment into this environment.
+
+        Add all features and symbols of ``other`` which are not in this
+        environment.  For symbols in both environments, add all scopes and
+        properties missing in this environment.
+
+        """
+        for name, feature in other.features.iteritems():
+            self.features.setdefault(name, feature)
+        for filename, records in other.forms.iteritems():
+            self.forms.setdefault(filename, records)
+        self._key_index = None
+        for symbol in other.top_level.itervalues():
+            own = self.top_level.get(symbol.name)
+            if own is None:
+                self.top_level[symbol.name] = symbol
+                continue
+            for scope, source in symbol.scopes.iteritems():
+                own.scopes.setdefault(scope, source)
+            for key, value in symbol.properties.iteritems():
+                own.properties.setdefault(key, value)
+
+    def relocate(self, filenames):
+        """Move libraries to other file names.
+
+        ``filenames`` is a dictionary which maps old file names of libraries
+        to their new file names.  Rewrite the file names of all features, form
+        records and definitions from these libraries.
+
+        """
+        for name, feature in self.features.items():
+            if feature.filename in filenames:
+                self.features[name] = feature._replace(
+                    filename=filenames[feature.filename])
+        self.forms = dict((filenames.get(filename, filename), records)
+                          for filename, records in self.forms.iteritems())
+        for symbol in self.top_level.itervalues():
+            for scope, source in symbol.scopes.items():
+                if source.file in filenames:
+                    symbol.scopes[scope] = source._replace(
+                        file=filenames[source.file])
+
+    def copy(self):
+        """Copy this environment into a plain :class:`AbstractEnvironment`.
+
+        The copy shares all symbol objects with this environment.
+
+        """
+        environment = AbstractEnvironment()
+        environment.features = dict(self.features)
+        environment.forms = dict(self.forms)
+        environment.top_level = dict(self.top_level.iteritems())
+        return environment
+
     def intern(self, name):
         """Obtain a symbol with ``name`` from the top-level symbol table.
 
@@ -186,6 +632,45 @@ class AbstractEnvironment(object):
             raise ValueError('Invalid symbol name: {0!r}'.format(name))
         return self.top_level.setdefault(name, Symbol(name))
 
+    def is_loaded(self, filename):
+        """Determine whether the library ``filename`` was loaded.
+
+        ``filename`` is the canonical name of the library, as by
+        :func:`os.path.realpath`.  A library is loaded, if its forms are
+        recorded.
+
+        """
+        return filename in self.forms
+
+    def provided_in(self, filename):
+        """Get the names of all features provided by forms in ``filename``.
+
+        Return a set of feature names.
+
+        """
+        return set(name for record in self.forms.get(filename, [])
+                   for name in record.provides)
+
+    def features_of(self, filename):
+        """Get the names of all provided features loaded from ``filename``.
+
+        Return a set of feature names.
+
+        """
+        return set(name for name, feature in self.features.iteritems()
+                   if feature.filename == filename)
+
+    def provide_all(self, names, filename):
+        """Provide all features with ``names`` from ``filename``.
+
+        Like :meth:`provide`, but only compute the digest of ``filename``
+        once.
+
+        """
+        feature = Feature.from_file(None, filename)
+        for name in names:
+            self.features[name] = feature._replace(name=name)
+
     def provide(self, name, filename=None):
         """Provide a feature with ``name``.
 
@@ -195,9 +680,7 @@ class AbstractEnvironment(object):
         Return the corresponding :class:`Feature` object.
 
         """
-        load_time = (os.path.getmtime(filename)
-                     if filename and os.path.isfile(filename) else 0)
-        feature = Feature(name=name, filename=filename, load_time=load_time)
+        feature = Feature.from_file(name, filename)
         self.features[name] = feature
         return feature
 
@@ -228,10 +711,17 @@ class AbstractInterpreter(object):
 
     """
 
-    def put(self, _context, _function, name, prop, value):
+    #: The version of the interpreter.
+    #
+    # Increase whenever the evaluation of forms or the structure of
+    # environments changes, to invalidate snapshots of environments.
+    version = 1
+
+    def put(self, context, _function, name, prop, value):
         """A call to ``put``.
 
-        Tries to set the symbol property as set by ``put``."""
+        Tries to set the symbol property as set by ``put``, and records the
+        property in the current form."""
         if all(lisputil.is_quoted_symbol(s) for s in [name, prop]):
             symbol = self.env.intern(lisputil.unquote(name))
             prop = lisputil.unquote(prop).value()
@@ -241,6 +731,9 @@ class AbstractInterpreter(object):
                 # We cannot handle non-constant values
                 return
             symbol.properties[prop] = value
+            properties = context.get('load_properties')
+            if properties is not None:
+                properties.append((symbol.name, prop))
 
     def defun(self, context, _function, name, arglist, docstring=None, *_rest):
         """A call to ``defun`` or ``defmacro``.
@@ -253,17 +746,19 @@ class AbstractInterpreter(object):
         if docstring:
             symbol.properties['function-documentation'] = docstring
 
-    def defvar(self, context, function, name, _initial_value=None,
+    def defvar(self, context, function, name, initial_value=None,
                docstring=None, *rest):
         """A call to ``defvar`` and friends.
 
         Includes ``defvar-local`` and ``defcustom``.
 
         Parses the variable documentation, and tries to look at the keyword
-        arguments to ``defcustom``.
+        arguments to ``defcustom``.  Collects the key bindings from the
+        initial value of keymap variables.
 
         """
         symbol = self.intern_in_scope(name, 'variable', context)
+        self.eval_keymap_definition(symbol.name, initial_value, context)
         if docstring:
             if isinstance(docstring, basestring):
                 symbol.properties['variable-documentation'] = docstring
@@ -275,6 +770,7 @@ class AbstractInterpreter(object):
         if rest and function == 'defcustom':
             symbol.properties.update(lisputil.parse_custom_keywords(rest))
         symbol.properties['buffer-local'] = function.endswith('-local')
+        symbol.properties['user-option'] = function == 'defcustom'
 
     def defface(self, context, function, name, _face_def, docstring, *rest):
         """A call to ``defface``.
@@ -287,12 +783,45 @@ class AbstractInterpreter(object):
         if rest:
             symbol.properties.update(lisputil.parse_custom_keywords(rest))
 
-    def eval_inner(self, _context, _function, *body):
+    def define_key(self, context, _function, keymap_variable, key, command,
+                   *_rest):
+        """A call to ``define-key``.
+
+        Records the binding, if ``keymap_variable`` is a symbol, ``key`` a
+        constant key sequence, and ``command`` a quoted symbol.  Local
+        variables bound to keymaps of keymap variables refer to these keymap
+        variables.
+
+        """
+        if isinstance(keymap_variable, sexpdata.Symbol):
+            name = keymap_variable.value()
+            name = context.get('keymap_variables', {}).get(name, name)
+            self.bind_key(context, name, key, command)
+
+    def global_set_key(self, context, _function, key, command, *_rest):
+        """A call to ``global-set-key``.
+
+        Records the binding in the global map.
+
+        """
+        self.bind_key(context, keymap.GLOBAL_MAP, key, command)
+
+    def provide(self, context, _function, feature, *_rest):
+        """A call to ``provide``.
+
+        Records the quoted ``feature`` as provided by the current form.
+
+        """
+        provides = context.get('load_provides')
+        if lisputil.is_quoted_symbol(feature) and provides is not None:
+            provides.append(lisputil.unquote(feature).value())
+
+    def eval_inner(self, context, _function, *body):
         """Evaluate the inner expressions of a function.
 
         Handles `eval-when-compile` and friends."""
         for sexp in body:
-            self.eval(sexp)
+            self.eval(sexp, context)
 
     #: The default function table.
     DEFAULT_FUNCTIONS = {
@@ -303,6 +832,9 @@ class AbstractInterpreter(object):
         'defcustom': defvar,
         'defvar-local': defvar,
         'defface': defface,
+        'define-key': define_key,
+        'provide': provide,
+        'global-set-key': global_set_key,
         'eval-and-compile': eval_inner,
         'eval-when-compile': eval_inner,
     }
@@ -323,6 +855,8 @@ class AbstractInterpreter(object):
         self.functions.update(functions)
         self.env = env or AbstractEnvironment()
         self.load_path = load_path
+        # Maps canonical file names to pending results of parse_library
+        self.pending = {}
 
     def intern_in_scope(self, symbol, scope, context):
         """Intern a ``symbol`` in a ``scope``.
@@ -333,9 +867,51 @@ class AbstractInterpreter(object):
         """
         symbol = self.env.intern(symbol)
         symbol.scopes[scope] = Source(file=context.get('load_file_name'),
-                                      feature=context.get('load_feature'))
+                                      feature=context.get('load_feature'),
+                                      lines=context.get('load_lines'))
+        definitions = context.get('load_definitions')
+        if definitions is not None:
+            definitions.append((symbol.name, scope))
         return symbol
 
+    def bind_key(self, context, keymap_name, key, command):
+        """Bind ``key`` to ``command`` in the keymap named ``keymap_name``.
+
+        ``key`` and ``command`` are the unevaluated expressions of the key
+        sequence and the command.  Ignore the binding, if either is not
+        constant.
+
+        """
+        keys = keymap.parse_key(key)
+        command = keymap.parse_command(command)
+        bindings = context.get('load_bindings')
+        if keys and command and bindings is not None:
+            bindings.append(keymap.KeyBinding(keymap_name, keys, command))
+
+    def eval_keymap_definition(self, keymap_name, sexp, context):
+        """Evaluate the definition ``sexp`` of the keymap ``keymap_name``.
+
+        Look for a ``let`` form which binds a new keymap to local variables,
+        and evaluate the body of the form, with the local variables referring
+        to ``keymap_name``.
+
+        """
+        if not (isinstance(sexp, list) and len(sexp) > 2 and
+                isinstance(sexp[0], sexpdata.Symbol) and
+                sexp[0].value() in ('let', 'let*') and
+                isinstance(sexp[1], list)):
+            return
+        variables = dict(context.get('keymap_variables', {}))
+        for binding in sexp[1]:
+            if (isinstance(binding, list) and len(binding) == 2 and
+                    isinstance(binding[0], sexpdata.Symbol) and
+                    keymap.is_keymap_constructor(binding[1])):
+                variables[binding[0].value()] = keymap_name
+        if variables:
+            body_context = new_context(context, keymap_variables=variables)
+            for body_sexp in sexp[2:]:
+                self.eval(body_sexp, body_context)
+
     def locate(self, feature):
         """Locate the library for ``feature``.
 
@@ -353,12 +929,38 @@ class AbstractInterpreter(object):
                           for d in self.load_path)
             return next((f for f in candidates if os.path.isfile(f)), None)
 
+    def prefetch(self, features, pool):
+        """Parse the libraries of ``features`` in the background.
+
+        ``features`` is an iterable of feature names, and ``pool`` a
+        :class:`multiprocessing.pool.Pool` to parse the libraries in.  Ignore
+        features which are already provided, or whose library does not exist.
+
+        :meth:`read_file` waits for the pending result instead of parsing the
+        library again.
+
+        """
+        for feature in features:
+            if self.env.is_provided(feature):
+                continue
+            filename = self.locate(feature)
+            if filename:
+                filename = os.path.realpath(filename)
+            if (filename and not self.env.is_loaded(filename) and
+                    filename not in self.pending):
+                self.pending[filename] = pool.apply_async(
+                    parse_library, (filename,))
+
     def require(self, feature, context=None):
         """Require a named feature.
 
         Locate and load the corresponding library.  Raise :class:`LookupError`
         if the library was not found.
 
+        Libraries are identified by their real path, and each library is only
+        loaded once, however it is reached.  Provide ``feature`` and all
+        features provided by ``provide`` forms in the library.
+
         ``context`` is a dictionary with context information.
 
         """
@@ -366,33 +968,188 @@ class AbstractInterpreter(object):
             filename = self.locate(feature)
             if not filename:
                 raise LookupError('Cannot locate library: {0}'.format(feature))
-            context = new_context(context, load_feature=feature)
-            self.load(filename, context)
-            self.env.provide(feature, filename=filename)
+            filename = os.path.realpath(filename)
+            if not self.env.is_loaded(filename):
+                context = new_context(
+                    context, load_feature=library_feature(filename))
+                self.load(filename, context)
+            names = self.env.provided_in(filename) | set([feature])
+            self.env.provide_all([name for name in names
+                                  if not self.env.is_provided(name)],
+                                 filename)
+
+    def reload(self, feature, report_moved=False):
+        """Reload a provided ``feature``.
+
+        If the forms of the library of ``feature`` were recorded when loading
+        it, only evaluate the forms which changed since.  Compare the digests
+        of all top-level forms to the recorded digests, retract the
+        definitions of all forms which were changed or removed, and evaluate
+        all new or changed forms.  Unchanged forms are not parsed again, but
+        their definitions are moved to the new line spans.
+
+        Retracting a definition also removes the properties of its scope, so
+        unchanged forms which ``put`` properties of any retracted symbol are
+        retracted and evaluated again as well.
+
+        Otherwise retract all definitions of the library and require the
+        feature again.  If the library does not exist anymore, just retract
+        its definitions.
+
+        Provide all features of the library again.
+
+        Return a set with the names of all symbols whose definitions changed.
+        If ``report_moved`` is ``True``, also include the names of all symbols
+        whose definitions only moved to other lines.
+
+        """
+        filename = self.env.features[feature].filename
+        records = self.env.forms.get(filename)
+        if records is None or not (filename and os.path.isfile(filename)):
+            return self.reload_library(feature, filename)
+        texts = read_forms(filename)
+        unmatched = {}
+        for record in records:
+            unmatched.setdefault(record.digest, []).append(record)
+        new_records = []
+        for text in texts:
+            candidates = unmatched.get(text.digest)
+            new_records.append(candidates.pop(0) if candidates else None)
+        retracted = [record for candidates in unmatched.itervalues()
+                     for record in candidates]
+        changed = set()
+        for record in retracted:
+            changed.update(self.names_of_record(record))
+        stale = set(index for index, record in enumerate(new_records)
+                    if record is None)
+        while True:
+            # Unchanged forms which put properties of changed symbols
+            more = [index for index, record in enumerate(new_records)
+                    if index not in stale and
+                    any(name in changed for name, _ in record.properties)]
+            if not more:
+                break
+            for index in more:
+                stale.add(index)
+                retracted.append(new_records[index])
+                changed.update(self.names_of_record(new_records[index]))
+        for record in retracted:
+            self.env.retract_record(filename, record)
+        for index, text in enumerate(texts):
+            if index not in stale:
+                moved = self.env.move_definitions(
+                    filename, new_records[index].definitions,
+                    (text.start, text.end))
+                if report_moved:
+                    changed.update(moved)
+        context = {'load_file_name': filename,
+                   'load_feature': library_feature(filename)}
+        for index in sorted(stale):
+            record = self.eval_form(Form.from_text(texts[index]), context)
+            changed.update(self.names_of_record(record))
+            new_records[index] = record
+        self.env.record_forms(filename, new_records)
+        self.env.provide_all(self.env.features_of(filename) |
+                             self.env.provided_in(filename), filename)
+        return changed
+
+    def reload_library(self, feature, filename):
+        """Reload the entire library ``filename`` of a provided ``feature``.
+
+        Return a set with the names of all symbols whose definitions changed.
+
+        """
+        before = self.env.definitions_from(filename)
+        records = self.env.forms.get(filename, [])
+        names = self.env.features_of(filename) | set([feature])
+        self.env.retract(filename)
+        for name in names:
+            del self.env.features[name]
+        try:
+            self.require(feature)
+        except LookupError:
+            pass
+        else:
+            self.env.provide_all([name for name in names
+                                  if not self.env.is_provided(name)],
+                                 self.env.features[feature].filename)
+        after = self.env.definitions_from(filename)
+        records = records + self.env.forms.get(filename, [])
+        changed = set(name for name in set(before) | set(after)
+                      if before.get(name) != after.get(name))
+        for record in records:
+            changed.update(self.names_of_record(record))
+        return changed
 
     def load(self, library, context=None):
         """Load a ``library``.
 
-        Evaluate all expressions in the ``library``.
+        Evaluate all top-level forms in the ``library``, and record the
+        definitions of each form in the environment.
 
-        ``library`` is the file name of a library as string.  ``context`` is a
-        dictionary with context information.
+        ``library`` is the canonical file name of a library as string.
+        ``context`` is a dictionary with context information.
 
         """
         context = new_context(context, load_file_name=library)
-        for sexp in self.read_file(library):
-            self.eval(sexp, context=context)
+        self.env.record_forms(library, [self.eval_form(form, context)
+                                        for form in self.read_file(library)])
+
+    def eval_form(self, form, context):
+        """Evaluate a top-level ``form`` from a library.
+
+        ``form`` is a :class:`Form`, and ``context`` a dictionary with context
+        information.
+
+        Return a :class:`FormRecord` for ``form``.
+
+        """
+        definitions = []
+        properties = []
+        bindings = []
+        provides = []
+        self.eval(form.sexp, context=new_context(
+            context, load_lines=(form.start, form.end),
+            load_definitions=definitions, load_properties=properties,
+            load_bindings=bindings, load_provides=provides))
+        return FormRecord(form.digest, definitions, properties, bindings,
+                          provides)
+
+    @staticmethod
+    def names_of_record(record):
+        """Get the names of all symbols affected by the form of ``record``.
+
+        Include defined symbols, symbols with properties set by the form, and
+        all keymaps and commands bound by the form.
+
+        """
+        names = set(name for name, _ in record.definitions)
+        names.update(name for name, _ in record.properties)
+        for binding in record.bindings:
+            names.update([binding.keymap, binding.command])
+        return names
 
     def read(self, string):
         """Parse and return a single expression from ``string``."""
         return sexpdata.loads(string)
 
     def read_file(self, filename):
-        """Parse and return all expressions from ``filename``."""
-        with open(filename, 'r') as source:
-            # Wrap source into a top-level sexp, to make it consumable for
-            # sexpdata
-            return self.read('(\n{0}\n)'.format(source.read()))
+        """Parse and return all top-level forms from ``filename``.
+
+        Return a list of :class:`Form` objects.
+
+        If ``filename`` is being parsed in the background, wait for the result
+        of :meth:`prefetch`.
+
+        """
+        pending = self.pending.pop(filename, None)
+        if pending:
+            try:
+                return pending.get()
+            except Exception:   # pylint: disable=W0703
+                # Parse the file again to report the error in place
+                pass
+        return parse_library(filename)
 
     def eval(self, sexp, context=None):
         """Evaluate a single ``sexp`` and return the result.
@@ -403,6 +1160,10 @@ class AbstractInterpreter(object):
 
         """
         sexp = strip_broken_function_quotes(sexp)
+        if not (isinstance(sexp, list) and sexp and
+                isinstance(sexp[0], sexpdata.Symbol)):
+            # Not a function call
+            return None
         function_name = sexp[0]
         args = sexp[1:]
         function = self.functions.get(function_name.value())
@@ -26,23 +26,47 @@
 import re
 
 
+#: The maximum length of quoted text and key references in docstrings.
+MAX_QUOTED_LENGTH = 200
+
+#: The maximum length of a meta variable in docstrings.
+MAX_METAVAR_LENGTH = 40
+
+#: The maximum length of the whitespace after reference prefixes.
+MAX_PREFIX_SPACE = 10
+
+
 class DocstringSourceTransformer(object):
-    """Transform Emacs docstring markup to ReST on source level."""
+    """Transform Emacs docstring markup to ReST on source level.
+
+    All quantifiers in the inline markup are bounded, so each match attempt
+    takes constant time and the transformation is linear in the length of
+    the docstring.  Quoted text and references do not span lines.
+
+    """
 
     #: Inline markup as understood by Emacs help mode.
-    INLINE_MARKUP =  re.compile(
+    #
+    # Each branch is wrapped into an outer named group, which is the last group
+    # closed by a match, and hence ``match.lastgroup`` denotes the branch.
+    INLINE_MARKUP = re.compile(
         r"""
-        (?:(?P<infoprefix>[Ii]nfo\s+(?:[Nn]ode|[Aa]nchor)\s+)`(?P<infonode>[^']+)') | # An info reference
-        (?:(?P<cmdprefix>[Cc]ommand\s+)`(?P<command>[^']+)') | # A command reference
-        (?:(?P<funprefix>[Ff]unction\s+)`(?P<function>[^']+)') | # A function reference
-        (?:(?P<optprefix>[Oo]ption\s+)`(?P<option>[^']+)') | # A option reference
-        (?:(?P<varprefix>[Vv]ariable\s+)`(?P<variable>[^']+)') | # A variable reference
-        (?:(?P<faceprefix>[Ff]ace\s+)`(?P<face>[^']+)') | # A face reference
-        (?:(?P<symprefix>[Ss]ymbol\s+)`(?P<symbol>[^']+)') | # A literal symbol
-        (?:(?P<urlprefix>URL\s+)`(?P<url>[^']+)') | # A URL reference
-        (?:`(?P<literal>[^']+)') | # A literal reference
-        (?:\b(?P<metavar>[A-Z][-_A-Z]+)\b) # A meta variable, as uppercase letters
-        """, re.MULTILINE | re.UNICODE | re.VERBOSE)
+        (?P<keys>\\\[(?P<keys_command>[^\]\s]{1,%(quoted)d})\]) | # The key sequence of a command
+        (?P<keymap>\\\{(?P<keymap_name>[^}\s]{1,%(quoted)d})\}) | # The bindings of a keymap
+        (?P<keymapcontext>\\<(?P<keymapcontext_name>[^>\s]{1,%(quoted)d})>) | # Switch to another keymap
+        (?P<infonode>(?P<infoprefix>[Ii]nfo\s{1,%(space)d}(?:[Nn]ode|[Aa]nchor)\s{1,%(space)d})`(?P<infonode_name>[^'\n]{1,%(quoted)d})') | # An info reference
+        (?P<command>(?P<cmdprefix>[Cc]ommand\s{1,%(space)d})`(?P<command_name>[^'\n]{1,%(quoted)d})') | # A command reference
+        (?P<function>(?P<funprefix>[Ff]unction\s{1,%(space)d})`(?P<function_name>[^'\n]{1,%(quoted)d})') | # A function reference
+        (?P<option>(?P<optprefix>[Oo]ption\s{1,%(space)d})`(?P<option_name>[^'\n]{1,%(quoted)d})') | # A option reference
+        (?P<variable>(?P<varprefix>[Vv]ariable\s{1,%(space)d})`(?P<variable_name>[^'\n]{1,%(quoted)d})') | # A variable reference
+        (?P<face>(?P<faceprefix>[Ff]ace\s{1,%(space)d})`(?P<face_name>[^'\n]{1,%(quoted)d})') | # A face reference
+        (?P<symbol>(?P<symprefix>[Ss]ymbol\s{1,%(space)d})`(?P<symbol_name>[^'\n]{1,%(quoted)d})') | # A literal symbol
+        (?P<url>(?P<urlprefix>URL\s{1,%(space)d})`(?P<url_target>[^'\n]{1,%(quoted)d})') | # A URL reference
+        (?P<literal>`(?P<literal_text>[^'\n]{1,%(quoted)d})') | # A literal reference
+        (?P<metavar>\b[A-Z][-_A-Z]{1,%(metavar)d}\b) # A meta variable, as uppercase letters
+        """ % {'quoted': MAX_QUOTED_LENGTH, 'metavar': MAX_METAVAR_LENGTH,
+               'space': MAX_PREFIX_SPACE},
+        re.MULTILINE | re.UNICODE | re.VERBOSE)
 
     #: Regular expression for a symbol.
     #
@@ -53,66 +77,96 @@ class DocstringSourceTransformer(object):
     #: A standalone meta variable
     METAVAR_PATTERN = re.compile(r'\b([-_A-Z]+)\b', re.UNICODE)
 
-    def __init__(self, min_metavars_chars=4):
+    def __init__(self, min_metavars_chars=4, keymaps=None):
         """Create a new inliner.
 
         ``min_metavars_chars`` is the minimum number of subsequent uppercase
         letters to consider as metavariable, to avoid marking normal acronyms
         such as XML as meta-variable.
 
+        ``keymaps`` is a :class:`~sphinxcontrib.emacs.lisp.keymap.KeymapIndex`
+        to look up key bindings in, or ``None``.
+
         """
         self.min_metavars_chars = min_metavars_chars
-        # The inliner to parse the contents of a literal.  Inside a literal, we
-        # consider all uppercase letters as meta-variable.
+        self.keymaps = keymaps
+        # The keymap to prefer when looking up keys, as set by \<keymap>
+        self.current_keymap = None
+        # The names of all commands and keymaps looked up by the last transform
+        self.key_lookups = set()
 
     def transform(self, docstring):
         """Transform ``docstring`` into pure ReST.
 
         Return the transformed docstring."""
+        self.current_keymap = None
+        self.key_lookups = set()
         return self.INLINE_MARKUP.sub(self._to_rst, docstring)
 
     def _to_rst(self, match):
         """Return the ReST replacement text for ``match``."""
-        groups = match.groupdict()
-        for key, value in groups.iteritems():
-            if value is not None:
-                transform = getattr(self, '_transform_' + key, None)
-                if transform:
-                    return transform(value, groups)
-        # The pattern wasn't handled, which is an implementation error!
-        raise NotImplementedError(
-            'Failed to handle a branch of the inline patterns!')
+        return self.TRANSFORMS[match.lastgroup](self, match)
 
     def _to_role(self, role, text, prefix=''):
         return '{0}:{1}:`{2}`'.format(prefix, role, text)
 
     # Handlers for pattern branches
 
-    def _transform_infonode(self, value, groups):
-        return self._to_role('infonode', value, prefix=groups['infoprefix'])
-
-    def _transform_command(self, value, groups):
-        return self._to_role('el:command', value, prefix=groups['cmdprefix'])
-
-    def _transform_function(self, value, groups):
-        return self._to_role('el:function', value, prefix=groups['funprefix'])
-
-    def _transform_option(self, value, groups):
-        return self._to_role('el:option', value, prefix=groups['optprefix'])
-
-    def _transform_variable(self, value, groups):
-        return self._to_role('el:variable', value, prefix=groups['varprefix'])
-
-    def _transform_face(self, value, groups):
-        return self._to_role('el:face', value, prefix=groups['faceprefix'])
-
-    def _transform_symbol(self, value, groups):
-        self._to_role('code', value, prefix=groups['symbprefix'])
-
-    def _transform_url(self, value, groups):
-        return '{0}{1}'.format(groups['urlprefix'], value)
-
-    def _transform_literal(self, value, _groups):
+    def _transform_keys(self, match):
+        command = match.group('keys_command')
+        self.key_lookups.add(command)
+        keys = self.keymaps and self.keymaps.keys_for(command,
+                                                      self.current_keymap)
+        return self._to_role('kbd', keys or 'M-x ' + command)
+
+    def _transform_keymap(self, match):
+        keymap = match.group('keymap_name')
+        self.key_lookups.add(keymap)
+        bindings = self.keymaps.bindings_of(keymap) if self.keymaps else []
+        if not bindings:
+            return self._to_role('el:variable', keymap)
+        items = ['* :kbd:`{0}`: :el:command:`{1}`'.format(
+            binding.keys, binding.command) for binding in bindings]
+        return '\n\n{0}\n\n'.format('\n'.join(items))
+
+    def _transform_keymapcontext(self, match):
+        self.current_keymap = match.group('keymapcontext_name')
+        return ''
+
+    def _transform_infonode(self, match):
+        return self._to_role('infonode', match.group('infonode_name'),
+                             prefix=match.group('infoprefix'))
+
+    def _transform_command(self, match):
+        return self._to_role('el:command', match.group('command_name'),
+                             prefix=match.group('cmdprefix'))
+
+    def _transform_function(self, match):
+        return self._to_role('el:function', match.group('function_name'),
+                             prefix=match.group('funprefix'))
+
+    def _transform_option(self, match):
+        return self._to_role('el:option', match.group('option_name'),
+                             prefix=match.group('optprefix'))
+
+    def _transform_variable(self, match):
+        return self._to_role('el:variable', match.group('variable_name'),
+                             prefix=match.group('varprefix'))
+
+    def _transform_face(self, match):
+        return self._to_role('el:face', match.group('face_name'),
+                             prefix=match.group('faceprefix'))
+
+    def _transform_symbol(self, match):
+        return self._to_role('code', match.group('symbol_name'),
+                             prefix=match.group('symprefix'))
+
+    def _transform_url(self, match):
+        return '{0}{1}'.format(match.group('urlprefix'),
+                               match.group('url_target'))
+
+    def _transform_literal(self, match):
+        value = match.group('literal_text')
         if self.SYMBOL_PATTERN.match(value):
             # A generic symbol reference
             return self._to_role('el:symbol', value)
@@ -124,20 +178,43 @@ class DocstringSourceTransformer(object):
                 value)
             return self._to_role('el:varcode', varcode)
 
-    def _transform_metavar(self, value, _groups):
+    def _transform_metavar(self, match):
+        value = match.group('metavar')
         if len(value) >= self.min_metavars_chars:
             return self._to_role('el:var', value.lower())
         else:
             return value
 
+    #: Maps the branches of :attr:`INLINE_MARKUP` to their handlers.
+    TRANSFORMS = {
+        'keys': _transform_keys,
+        'keymap': _transform_keymap,
+        'keymapcontext': _transform_keymapcontext,
+        'infonode': _transform_infonode,
+        'command': _transform_command,
+        'function': _transform_function,
+        'option': _transform_option,
+        'variable': _transform_variable,
+        'face': _transform_face,
+        'symbol': _transform_symbol,
+        'url': _transform_url,
+        'literal': _transform_literal,
+        'metavar': _transform_metavar,
+    }
+
 
 DEFAULT_DOCSTRING_TRANSFORMER = DocstringSourceTransformer()
 
 
-def transform_emacs_markup_to_rst(docstring):
+def transform_emacs_markup_to_rst(docstring, keymaps=None):
     """Convert all Emacs markup in ``docstring`` to ReST equivalents.
 
+    ``keymaps`` is a :class:`~sphinxcontrib.emacs.lisp.keymap.KeymapIndex` to
+    substitute key bindings from, or ``None``.
+
     Return the transformed docstring.
 
     """
-    return DEFAULT_DOCSTRING_TRANSFORMER.transform(docstring)
+    if keymaps is None:
+        return DEFAULT_DOCSTRING_TRANSFORMER.transform(docstring)
+    return DocstringSourceTransformer(keymaps=keymaps).transform(docstring)
@@ -0,0 +1,160 @@
+# -*- coding: utf-8; -*-
+# Copyright (c) 2014 Sebastian Wiesner <lunaryorn@gmail.com>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+"""Read the header of Emacs Lisp libraries.
+
+Emacs Lisp libraries start with a header of comments, with a summary line,
+header fields like ``Version:`` or ``Package-Requires:``, and a
+``;;; Commentary:`` section.  The header reader only reads the lines before
+``;;; Code:``, so the cost of reading a header does not depend on the length
+of the library.
+
+"""
+
+
+import re
+from io import open
+from collections import namedtuple
+
+import sexpdata
+
+
+#: The summary line of a library.
+SUMMARY_RE = re.compile(r'^;;;\s*(?P<file>\S+)\s+---\s*(?P<summary>.*?)\s*'
+                        r'(?:-\*-.*-\*-\s*)?$')
+
+#: A header field.
+FIELD_RE = re.compile(r'^;;+\s*(?P<key>[A-Za-z][-A-Za-z ]*?)\s*:\s*'
+                      r'(?P<value>.*?)\s*$')
+
+#: A section heading.
+SECTION_RE = re.compile(r'^;;;\s*(?P<section>[A-Za-z][-A-Za-z ]*?)\s*:\s*$')
+
+#: Header fields, and the corresponding fields of :class:`LibraryHeader`.
+FIELDS = {
+    'version': 'version',
+    'package-version': 'version',
+    'package-requires': 'requires',
+    'keywords': 'keywords',
+    'url': 'url',
+    'homepage': 'url',
+    'author': 'author',
+}
+
+
+class LibraryHeader(namedtuple('_LibraryHeader', 'feature summary version '
+                                                 'requires keywords url '
+                                                 'author commentary')):
+    """The metadata of a library, as read from its header.
+
+    ``feature`` is the name of the feature of the library, and ``summary``
+    the summary line.  ``version``, ``url`` and ``author`` are strings from
+    the corresponding header fields.  ``requires`` is a list of pairs of
+    package name and version from ``Package-Requires``, and ``keywords`` a
+    list of keywords.  ``commentary`` is a list of the lines of the
+    commentary section, without comment starters.
+
+    Missing fields are ``None``, or empty lists.
+
+    """
+    pass
+
+
+def parse_requires(value):
+    """Parse the ``value`` of a ``Package-Requires`` field.
+
+    Return a list of ``(package, version)`` pairs, where ``version`` is
+    ``None`` if the requirement has no version.  Return an empty list, if
+    ``value`` is not a valid list of requirements.
+
+    """
+    try:
+        requirements = sexpdata.loads(value)
+    except Exception:   # pylint: disable=W0703
+        return []
+    if not isinstance(requirements, list):
+        return []
+    result = []
+    for requirement in requirements:
+        if (isinstance(requirement, list) and requirement and
+                isinstance(requirement[0], sexpdata.Symbol)):
+            version = requirement[1] if len(requirement) > 1 else None
+            result.append((requirement[0].value(),
+                           version if isinstance(version, basestring)
+                           else None))
+    return result
+
+
+def strip_comment(line):
+    """Strip the comment starter and one space from ``line``."""
+    return re.sub(r'^;+ ?', '', line).rstrip()
+
+
+def read_header(feature, filename):
+    """Read the header of the library ``filename`` of ``feature``.
+
+    Read lines up to ``;;; Code:``, or up to the first line which is neither
+    a comment nor empty.
+
+    Return a :class:`LibraryHeader`.
+
+    """
+    fields = {'summary': None, 'version': None, 'requires': [],
+              'keywords': [], 'url': None, 'author': None}
+    commentary = []
+    section = None
+    with open(filename, encoding='utf-8', errors='replace') as source:
+        for lineno, line in enumerate(source):
+            line = line.rstrip('\r\n')
+            if line.strip() and not line.lstrip().startswith(';'):
+                break
+            match = SECTION_RE.match(line)
+            if match:
+                section = match.group('section').lower()
+                if section == 'code':
+                    break
+                continue
+            if lineno == 0:
+                match = SUMMARY_RE.match(line)
+                if match:
+                    fields['summary'] = match.group('summary') or None
+                    continue
+            if section == 'commentary':
+                commentary.append(strip_comment(line))
+                continue
+            match = FIELD_RE.match(line)
+            if match and section is None:
+                field = FIELDS.get(match.group('key').lower())
+                value = match.group('value')
+                if field == 'requires':
+                    fields[field] = parse_requires(value)
+                elif field == 'keywords':
+                    fields[field] = [k for k in re.split(r'[\s,]+', value)
+                                     if k]
+                elif field and fields[field] is None:
+                    fields[field] = value
+    while commentary and not commentary[0]:
+        commentary.pop(0)
+    while commentary and not commentary[-1]:
+        commentary.pop()
+    return LibraryHeader(feature=feature, commentary=commentary, **fields)
@@ -0,0 +1,206 @@
+# -*- coding: utf-8; -*-
+# Copyright (c) 2014 Sebastian Wiesner <lunaryorn@gmail.com>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""Key bindings and keymaps.
+
+Collect the key bindings made by ``define-key`` and friends, and index them by
+keymap and by command, to substitute key bindings in docstrings like
+``substitute-command-keys`` does.
+
+"""
+
+
+from collections import namedtuple
+
+import sexpdata
+
+
+#: The name of the global keymap.
+GLOBAL_MAP = 'global-map'
+
+#: Functions which create a new keymap.
+KEYMAP_CONSTRUCTORS = frozenset(['make-sparse-keymap', 'make-keymap'])
+
+#: Functions which turn a key description into a key sequence.
+KEY_READERS = frozenset(['kbd', 'read-kbd-macro'])
+
+#: Names of special characters in key sequences.
+KEY_NAMES = {
+    '\t': 'TAB',
+    '\r': 'RET',
+    '\x1b': 'ESC',
+    ' ': 'SPC',
+    '\x7f': 'DEL',
+}
+
+#: Characters denoted by escape sequences in key strings.
+KEY_ESCAPES = {'e': '\x1b', 't': '\t', 'r': '\r', 'n': '\n', 'd': '\x7f'}
+
+
+class KeyBinding(namedtuple('_KeyBinding', 'keymap keys command')):
+    """A key binding.
+
+    ``keymap`` is the name of the keymap variable, ``keys`` the description
+    of the key sequence, as by ``key-description``, and ``command`` the name of
+    the bound command.
+
+    """
+    pass
+
+
+def describe_key_string(keys):
+    """Describe the key sequence in the string ``keys``.
+
+    Understand both control characters and escapes like ``\\C-c`` or
+    ``\\M-x``.
+
+    Return the description as string, like ``key-description``.
+
+    """
+    described = []
+    modifiers = ''
+    index = 0
+    while index < len(keys):
+        char = keys[index]
+        if (char == '\\' and keys[index + 1:index + 2] in list('CMSsHA') and
+                keys[index + 2:index + 3] == '-'):
+            modifiers += keys[index + 1] + '-'
+            index += 3
+            continue
+        if char == '\\' and index + 1 < len(keys):
+            index += 1
+            char = KEY_ESCAPES.get(keys[index], keys[index])
+        if char in KEY_NAMES:
+            name = KEY_NAMES[char]
+        elif ord(char) < 32:
+            name = 'C-' + chr(ord(char) + 96)
+        else:
+            name = char
+        described.append(modifiers + name)
+        modifiers = ''
+        index += 1
+    return ' '.join(described)
+
+
+def parse_key(sexp):
+    """Parse the key sequence ``sexp`` of a key binding.
+
+    ``sexp`` is either a string, or a call to ``kbd`` with a constant string.
+
+    Return the description of the key sequence as string, or ``None``, if
+    ``sexp`` is not a constant key sequence.
+
+    """
+    if isinstance(sexp, basestring):
+        return describe_key_string(sexp) or None
+    if (isinstance(sexp, list) and len(sexp) == 2 and
+            isinstance(sexp[0], sexpdata.Symbol) and
+            sexp[0].value() in KEY_READERS and
+            isinstance(sexp[1], basestring)):
+        return ' '.join(sexp[1].split()) or None
+    return None
+
+
+def parse_command(sexp):
+    """Parse the command ``sexp`` of a key binding.
+
+    Return the name of the command as string, or ``None``, if ``sexp`` is not
+    a quoted symbol.
+
+    """
+    if (isinstance(sexp, sexpdata.Quoted) and
+            isinstance(sexp.value(), sexpdata.Symbol)):
+        return sexp.value().value()
+    return None
+
+
+def is_keymap_constructor(sexp):
+    """Determine whether ``sexp`` creates a new keymap."""
+    return (isinstance(sexp, list) and sexp and
+            isinstance(sexp[0], sexpdata.Symbol) and
+            sexp[0].value() in KEYMAP_CONSTRUCTORS)
+
+
+class KeymapIndex(object):
+    """An index of key bindings by keymap and by command.
+
+    Later bindings of the same key sequence in a keymap override earlier
+    bindings.
+
+    """
+
+    def __init__(self, bindings):
+        """Create a new index of all ``bindings``.
+
+        ``bindings`` is an iterable over :class:`KeyBinding` objects, in the
+        order in which the bindings were made.
+
+        """
+        self.keymaps = {}
+        for binding in bindings:
+            self.keymaps.setdefault(binding.keymap, {})[binding.keys] = binding
+        self.commands = {}
+        for keymap in self.keymaps.itervalues():
+            for binding in keymap.itervalues():
+                self.commands.setdefault(binding.command, []).append(binding)
+        for bindings in self.commands.itervalues():
+            bindings.sort(key=lambda b: (len(b.keys), b.keys))
+
+    @classmethod
+    def from_forms(cls, forms):
+        """Create an index from the ``forms`` of an environment.
+
+        ``forms`` maps file names to lists of
+        :class:`~sphinxcontrib.emacs.lisp.FormRecord` objects.
+
+        """
+        return cls(binding for filename in sorted(forms)
+                   for record in forms[filename]
+                   for binding in record.bindings)
+
+    def keys_for(self, command, keymap=None):
+        """Get the key sequence which invokes ``command``.
+
+        Prefer bindings in ``keymap``, then in the global map, and then the
+        shortest binding in any keymap.
+
+        Return the description of the key sequence, or ``None``, if
+        ``command`` is not bound.
+
+        """
+        bindings = self.commands.get(command)
+        if not bindings:
+            return None
+        for preferred in (keymap, GLOBAL_MAP):
+            for binding in bindings:
+                if binding.keymap == preferred:
+                    return binding.keys
+        return bindings[0].keys
+
+    def bindings_of(self, keymap):
+        """Get all bindings of ``keymap``.
+
+        Return a list of :class:`KeyBinding` objects, sorted by key sequence.
+
+        """
+        return sorted(self.keymaps.get(keymap, {}).itervalues(),
+                      key=lambda b: b.keys)
@@ -0,0 +1,111 @@
+# -*- coding: utf-8; -*-
+# Copyright (c) 2014 Sebastian Wiesner <lunaryorn@gmail.com>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+"""Split Emacs Lisp source into top-level forms.
+
+The reader does not parse Emacs Lisp, but just tracks strings, comments,
+character literals and parentheses, to find the text and the line span of each
+top-level form.  Each form is then parsed on its own.
+
+"""
+
+
+import hashlib
+from collections import namedtuple
+
+
+#: Characters after which a ``?`` starts a character literal.
+CHAR_LITERAL_PREFIXES = frozenset(' \t\n\r\f(\'`,')
+
+
+class FormText(namedtuple('_FormText', 'text start end')):
+    """The ``text`` of a top-level form.
+
+    ``start`` and ``end`` are the first and last line of the form, starting
+    at 1.
+
+    """
+
+    @property
+    def digest(self):
+        """The SHA1 digest of the text of this form, as hex string."""
+        return hashlib.sha1(self.text).hexdigest()
+
+
+def split_forms(source):
+    """Split ``source`` into top-level forms.
+
+    Only consider parenthesized forms, optionally preceded by quotes, and
+    skip top-level atoms.
+
+    Return a generator over :class:`FormText` objects.
+
+    """
+    depth = 0
+    line = 1
+    start = None
+    start_line = None
+    index = 0
+    length = len(source)
+    while index < length:
+        char = source[index]
+        if char == '\n':
+            line += 1
+        elif char == ';':
+            end = source.find('\n', index)
+            index = length if end < 0 else end
+            continue
+        elif char == '"':
+            index += 1
+            while index < length and source[index] != '"':
+                if source[index] == '\\':
+                    index += 1
+                if index < length and source[index] == '\n':
+                    line += 1
+                index += 1
+        elif char == '?' and (index == 0 or
+                              source[index - 1] in CHAR_LITERAL_PREFIXES):
+            # Skip over the character literal, to not count escaped parens
+            index += 3 if source[index + 1:index + 2] == '\\' else 2
+            continue
+        elif char in '([':
+            if depth == 0 and start is None:
+                start = index
+                start_line = line
+            depth += 1
+        elif char in ')]':
+            depth -= 1
+            if depth <= 0:
+                if start is not None:
+                    yield FormText(source[start:index + 1], start_line, line)
+                depth = 0
+                start = None
+        elif depth == 0 and char in '\'`#,':
+            # A quoted form at top-level
+            if start is None:
+                start = index
+                start_line = line
+        elif depth == 0 and not char.isspace():
+            # A top-level atom, which we skip
+            start = None
+        index += 1
@@ -0,0 +1,286 @@
+# -*- coding: utf-8; -*-
+# Copyright (c) 2014 Sebastian Wiesner <lunaryorn@gmail.com>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+"""Persistent storage of interpreter environments.
+
+A :class:`StoredEnvironment` keeps its symbol table in a SQLite database
+instead of memory.  Symbols are only loaded from the database when looked up,
+and pickling the environment just stores the database file name and a version
+stamp.
+
+"""
+
+
+import os
+import sqlite3
+import cPickle as pickle
+from collections import MutableMapping
+from uuid import uuid4
+
+from sphinxcontrib.emacs.lisp import AbstractEnvironment, Symbol
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS symbols (
+    name TEXT PRIMARY KEY,
+    properties BLOB
+);
+CREATE TABLE IF NOT EXISTS scopes (
+    name TEXT,
+    scope TEXT,
+    file TEXT,
+    feature TEXT,
+    source BLOB,
+    PRIMARY KEY (name, scope)
+);
+CREATE INDEX IF NOT EXISTS scopes_by_scope ON scopes (scope);
+CREATE INDEX IF NOT EXISTS scopes_by_file ON scopes (file);
+CREATE INDEX IF NOT EXISTS scopes_by_feature ON scopes (feature);
+CREATE TABLE IF NOT EXISTS features (
+    name TEXT PRIMARY KEY,
+    feature BLOB
+);
+CREATE TABLE IF NOT EXISTS forms (
+    file TEXT PRIMARY KEY,
+    records BLOB
+);
+"""
+
+
+def dump_blob(value):
+    """Pickle ``value`` into a SQLite blob."""
+    return sqlite3.Binary(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+
+
+def load_blob(blob):
+    """Unpickle a value from a SQLite ``blob``."""
+    return pickle.loads(str(blob))
+
+
+class SymbolTable(MutableMapping):
+    """A symbol table backed by a SQLite database.
+
+    Symbols are loaded lazily from the database, and cached in memory
+    afterwards.  :meth:`flush` writes all cached symbols back to the database.
+
+    """
+
+    def __init__(self, connection):
+        """Create a new symbol table on top of the SQLite ``connection``."""
+        self.connection = connection
+        self.cache = {}
+        self.deleted = set()
+
+    def load(self, name):
+        """Load the symbol with ``name`` from the database.
+
+        Return the :class:`~sphinxcontrib.emacs.lisp.Symbol`, or ``None`` if
+        the database has no such symbol.
+
+        """
+        row = self.connection.execute(
+            'SELECT properties FROM symbols WHERE name = ?',
+            (name,)).fetchone()
+        if not row:
+            return None
+        symbol = Symbol(name)
+        symbol.properties = load_blob(row[0])
+        cursor = self.connection.execute(
+            'SELECT scope, source FROM scopes WHERE name = ?', (name,))
+        symbol.scopes = dict((scope, load_blob(source))
+                             for scope, source in cursor)
+        return symbol
+
+    def names_defined_in(self, filename):
+        """Get the names of all stored symbols defined in ``filename``."""
+        cursor = self.connection.execute(
+            'SELECT DISTINCT name FROM scopes WHERE file = ?', (filename,))
+        return set(name for (name,) in cursor) - self.deleted
+
+    def stored_names(self):
+        """Get the names of all symbols in the database."""
+        cursor = self.connection.execute('SELECT name FROM symbols')
+        return set(name for (name,) in cursor) - self.deleted
+
+    def flush(self):
+        """Write all cached and deleted symbols to the database."""
+        names = [(name,) for name in self.deleted | set(self.cache)]
+        self.connection.executemany(
+            'DELETE FROM symbols WHERE name = ?', names)
+        self.connection.executemany(
+            'DELETE FROM scopes WHERE name = ?', names)
+        self.connection.executemany(
+            'INSERT INTO symbols (name, properties) VALUES (?, ?)',
+            ((symbol.name, dump_blob(symbol.properties))
+             for symbol in self.cache.itervalues()))
+        self.connection.executemany(
+            'INSERT INTO scopes (name, scope, file, feature, source) '
+            'VALUES (?, ?, ?, ?, ?)',
+            ((symbol.name, scope, source.file, source.feature,
+              dump_blob(source))
+             for symbol in self.cache.itervalues()
+             for scope, source in symbol.scopes.iteritems()))
+        self.deleted.clear()
+
+    def __getitem__(self, name):
+        symbol = self.cache.get(name)
+        if symbol is None and name not in self.deleted:
+            symbol = self.load(name)
+            if symbol is not None:
+                self.cache[name] = symbol
+        if symbol is None:
+            raise KeyError(name)
+        return symbol
+
+    def __setitem__(self, name, symbol):
+        self.deleted.discard(name)
+        self.cache[name] = symbol
+
+    def __delitem__(self, name):
+        if name not in self:
+            raise KeyError(name)
+        self.cache.pop(name, None)
+        self.deleted.add(name)
+
+    def __contains__(self, name):
+        try:
+            self[name]
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        return iter(self.stored_names() | set(self.cache))
+
+    def __len__(self):
+        return len(self.stored_names() | set(self.cache))
+
+
+class StoredEnvironment(AbstractEnvironment):
+    """An interpreter environment stored in a SQLite database.
+
+    The environment behaves like a :class:`AbstractEnvironment`, but keeps its
+    symbols, features and form records in the database at ``filename``.
+    Symbols are queried lazily, and only the symbols actually used during a
+    build are loaded into memory.
+
+    Pickling the environment flushes all changes to the database, and only
+    pickles the database file name and a version stamp.  If the database was
+    changed or removed in the meantime, the unpickled environment is empty
+    and :attr:`reset` is ``True``.
+
+    """
+
+    def __init__(self, filename):
+        """Create a new empty environment stored at ``filename``.
+
+        Any existing contents of the database are discarded.
+
+        """
+        AbstractEnvironment.__init__(self)
+        self.filename = filename
+        self.version = None
+        self.reset = False
+        self._connect()
+        self._clear()
+
+    def _connect(self):
+        """Connect to the database and load all features and forms."""
+        directory = os.path.dirname(self.filename)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.connection = sqlite3.connect(self.filename)
+        self.connection.executescript(SCHEMA)
+        self.top_level = SymbolTable(self.connection)
+        self.features = dict(
+            (name, load_blob(feature)) for name, feature
+            in self.connection.execute('SELECT name, feature FROM features'))
+        self.forms = dict(
+            (filename, load_blob(records)) for filename, records
+            in self.connection.execute('SELECT file, records FROM forms'))
+
+    def _clear(self):
+        """Remove all symbols, features and forms from the database."""
+        for table in ['meta', 'symbols', 'scopes', 'features', 'forms']:
+            self.connection.execute('DELETE FROM {0}'.format(table))
+        self.connection.commit()
+        self.top_level = SymbolTable(self.connection)
+        self.features = {}
+        self.forms = {}
+
+    @property
+    def stored_version(self):
+        """The version stamp in the database, or ``None``."""
+        row = self.connection.execute(
+            "SELECT value FROM meta WHERE key = 'version'").fetchone()
+        return row[0] if row else None
+
+    def symbols_defined_in(self, filename):
+        """Get all symbols with at least one definition from ``filename``.
+
+        Query the database for stored symbols, instead of loading all symbols.
+
+        """
+        names = self.top_level.names_defined_in(filename)
+        names.update(name for name, symbol in self.top_level.cache.iteritems()
+                     if any(source.file == filename
+                            for source in symbol.scopes.itervalues()))
+        return [self.top_level[name] for name in names]
+
+    def resident_symbols(self):
+        """Get all symbols loaded from the database or created in memory."""
+        return self.top_level.cache.itervalues()
+
+    def flush(self):
+        """Write all changes to the database, and stamp a new version."""
+        self.top_level.flush()
+        self.connection.execute('DELETE FROM features')
+        self.connection.executemany(
+            'INSERT INTO features (name, feature) VALUES (?, ?)',
+            ((name, dump_blob(feature))
+             for name, feature in self.features.iteritems()))
+        self.connection.execute('DELETE FROM forms')
+        self.connection.executemany(
+            'INSERT INTO forms (file, records) VALUES (?, ?)',
+            ((filename, dump_blob(records))
+             for filename, records in self.forms.iteritems()))
+        self.version = uuid4().hex
+        self.connection.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)",
+            (self.version,))
+        self.connection.commit()
+
+    def __getstate__(self):
+        self.flush()
+        return {'filename': self.filename, 'version': self.version}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._connect()
+        self.reset = self.stored_version != self.version
+        if self.reset:
+            self._clear()
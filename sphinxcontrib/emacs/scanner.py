@@ -0,0 +1,144 @@
+# -*- coding: utf-8; -*-
+# Copyright (c) 2014 Sebastian Wiesner <lunaryorn@gmail.com>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+"""Scan document sources for Emacs Lisp directives.
+
+The scanner looks at the raw source of documents, without parsing them, to
+find out about Emacs Lisp libraries before Sphinx reads any document.
+
+"""
+
+
+import re
+from io import open
+from collections import namedtuple
+
+
+#: Regular expression to find ``el:require`` directives in a document.
+REQUIRE_RE = re.compile(r'^\s*\.\.\s+el:require::\s*(?P<feature>\S+)\s*$',
+                        re.MULTILINE | re.UNICODE)
+
+
+#: Regular expression for a description directive.
+DIRECTIVE_RE = re.compile(
+    r'^(?P<indent>\s*)\.\.\s+el:(?P<objtype>[-\w]+)::\s*(?P<signature>.*)$',
+    re.UNICODE)
+
+#: Regular expression for a directive option.
+OPTION_RE = re.compile(r'^(?P<indent>\s+):(?P<option>[-\w]+):', re.UNICODE)
+
+#: Regular expression for a role in the Emacs Lisp domain.
+ROLE_RE = re.compile(r':el:(?P<role>[-\w]+):`(?P<content>[^`]+)`', re.UNICODE)
+
+#: Regular expression for the target of a role with an explicit title.
+EXPLICIT_TARGET_RE = re.compile(r'^.+?\s*<(?P<target>.*?)>$',
+                                re.DOTALL | re.UNICODE)
+
+
+class Description(namedtuple('_Description', 'objtype name options lineno')):
+    """A description directive found by :func:`scan_document`.
+
+    ``objtype`` is the object type of the directive, ``name`` the symbol name
+    from its signature, ``options`` a set of the names of all options, and
+    ``lineno`` the line number of the directive.
+
+    """
+    pass
+
+
+class Reference(namedtuple('_Reference', 'role target lineno')):
+    """A reference role found by :func:`scan_document`.
+
+    ``role`` is the name of the role, without domain, ``target`` the
+    referenced symbol name, and ``lineno`` the line number of the role.
+
+    """
+    pass
+
+
+def role_target(content):
+    """Get the target from the ``content`` of a cross-reference role."""
+    match = EXPLICIT_TARGET_RE.match(content)
+    target = match.group('target') if match else content
+    return target.lstrip('~!')
+
+
+def scan_document(filename, encoding='utf-8'):
+    """Scan the document at ``filename`` for Emacs Lisp markup.
+
+    Return a pair ``(descriptions, references)`` of lists of
+    :class:`Description` and :class:`Reference` objects.
+
+    """
+    descriptions = []
+    references = []
+    lines = read_source(filename, encoding).splitlines()
+    for index, line in enumerate(lines):
+        for match in ROLE_RE.finditer(line):
+            references.append(Reference(
+                role=match.group('role'),
+                target=role_target(match.group('content')), lineno=index + 1))
+        match = DIRECTIVE_RE.match(line)
+        if not match or not match.group('signature').strip():
+            continue
+        options = set()
+        for option_line in lines[index + 1:]:
+            option_match = OPTION_RE.match(option_line)
+            if (not option_match or len(option_match.group('indent')) <=
+                    len(match.group('indent'))):
+                break
+            options.add(option_match.group('option'))
+        descriptions.append(Description(
+            objtype=match.group('objtype'),
+            name=match.group('signature').split()[0], options=options,
+            lineno=index + 1))
+    return descriptions, references
+
+
+def read_source(filename, encoding='utf-8'):
+    """Read the source of the document at ``filename``.
+
+    Return the contents as string, or an empty string if the file cannot be
+    read.
+
+    """
+    try:
+        with open(filename, encoding=encoding, errors='replace') as source:
+            return source.read()
+    except (IOError, OSError):
+        return ''
+
+
+def find_required_features(filenames, encoding='utf-8'):
+    """Find all features required in the documents at ``filenames``.
+
+    Return a list of feature names, in order of their first occurrence.
+
+    """
+    features = []
+    for filename in filenames:
+        for match in REQUIRE_RE.finditer(read_source(filename, encoding)):
+            feature = match.group('feature')
+            if feature not in features:
+                features.append(feature)
+    return features
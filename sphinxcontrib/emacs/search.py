@@ -0,0 +1,98 @@
+# -*- coding: utf-8; -*-
+# Copyright (c) 2014 Sebastian Wiesner <lunaryorn@gmail.com>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+"""A compact search index for Emacs Lisp symbols.
+
+Instead of putting all Emacs Lisp symbols into the general search index of
+Sphinx, write a dedicated index of symbols for HTML output.  The index is
+split into chunks by the first character of symbol names.  Each chunk is a
+sorted list of symbols, which is loaded lazily by ``elisp-symbols.js`` and
+searched for completions by prefix.
+
+"""
+
+
+import os
+import json
+from io import open
+
+from sphinxcontrib.emacs.util import symbol_initial
+
+
+#: The directory for index chunks, relative to the output directory.
+INDEX_DIRECTORY = os.path.join('_static', 'elisp-symbols')
+
+#: The directory with static files of this extension.
+STATIC_DIRECTORY = os.path.join(os.path.dirname(__file__), 'static')
+
+def build_chunks(builder, domain, types):
+    """Build the chunks of the symbol index for ``domain``.
+
+    ``types`` is a list of the names of all object types.
+
+    Return a dictionary mapping chunk keys, as returned by
+    :func:`~sphinxcontrib.emacs.util.symbol_initial`, to lists of entries.
+    Each entry is a list ``[name, type, uri]``, where ``type`` is the index of
+    the object type in ``types``, and ``uri`` is relative to the root of the
+    output directory.  The entries are sorted by name.
+
+    """
+    chunks = {}
+    for name, _, objtype, docname, anchor, _ in domain.get_objects():
+        uri = '{0}#{1}'.format(builder.get_target_uri(docname), anchor)
+        chunks.setdefault(symbol_initial(name), []).append(
+            [name, types.index(objtype), uri])
+    for entries in chunks.itervalues():
+        entries.sort()
+    return chunks
+
+
+def add_search_helper(app):
+    """Add the search helper to HTML output, if enabled."""
+    if app.config.emacs_lisp_search_index and app.builder.format == 'html':
+        app.config.html_static_path.append(STATIC_DIRECTORY)
+        app.add_javascript('elisp-symbols.js')
+
+
+def write_search_index(app, exception):
+    """Write the chunks of the symbol index into the output directory.
+
+    Only write the index for HTML output, and only if the
+    ``emacs_lisp_search_index`` option is set.
+
+    """
+    if (exception or not app.config.emacs_lisp_search_index or
+            app.builder.format != 'html'):
+        return
+    domain = app.env.domains['el']
+    types = sorted(domain.object_types)
+    directory = os.path.join(app.outdir, INDEX_DIRECTORY)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    chunks = build_chunks(app.builder, domain, types)
+    for key, entries in chunks.iteritems():
+        filename = os.path.join(directory, key + '.js')
+        with open(filename, 'w', encoding='utf-8') as sink:
+            sink.write('ElispSymbols.setChunk({0},{1},{2});'.format(
+                json.dumps(key), json.dumps(types, separators=(',', ':')),
+                json.dumps(entries, separators=(',', ':'))).decode('utf-8'))
@@ -0,0 +1,323 @@
+# -*- coding: utf-8; -*-
+# Copyright (c) 2014 Sebastian Wiesner <lunaryorn@gmail.com>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+"""Serve symbol queries from a built documentation environment.
+
+The query server loads the environment pickle of a Sphinx build once, and
+answers exact, prefix and scope-filtered queries for Emacs Lisp symbols from
+sorted in-memory indexes.  Queries are served over HTTP, or as JSON Lines over
+a Unix socket.  The server reloads the environment whenever the pickle
+changes, and keeps serving the previous environment while the pickle cannot be
+loaded, e.g. because Sphinx is still writing it.
+
+Over HTTP, ``GET /exact?name=NAME`` and ``GET /prefix?prefix=PREFIX`` return
+JSON lists of matching symbols, both optionally filtered by ``scope``, and
+limited by ``limit``.  Over a Unix socket, each request line is a JSON object
+with ``query`` set to ``exact`` or ``prefix``, and the same arguments.
+
+"""
+
+
+import os
+import sys
+import json
+import cPickle as pickle
+from bisect import bisect_left
+from argparse import ArgumentParser
+from urlparse import urlparse, parse_qs
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import UnixStreamServer, StreamRequestHandler
+
+from sphinxcontrib.emacs.util import make_target
+from sphinxcontrib.emacs.lisp.store import StoredEnvironment
+
+
+#: The default maximum number of results of a query.
+DEFAULT_LIMIT = 50
+
+#: Errors from loading an environment pickle which is missing, incomplete or
+#: otherwise broken.
+LOAD_ERRORS = (IOError, OSError, EOFError, pickle.UnpicklingError,
+               LookupError, ValueError, AttributeError, ImportError)
+
+
+class QueryError(ValueError):
+    """An invalid query."""
+    pass
+
+
+class SymbolIndex(object):
+    """Sorted indexes over the symbols of an Emacs Lisp domain."""
+
+    def __init__(self, domaindata):
+        """Create a new index from the ``domaindata`` of the domain."""
+        self.environment = domaindata.get('environment')
+        entries = []
+        for name, scopes in domaindata['namespace'].iteritems():
+            for scope, (docname, objtype) in scopes.iteritems():
+                entries.append((name, scope, docname, objtype))
+        entries.sort()
+        self.entries = entries
+        self.names = [entry[0] for entry in entries]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def to_json(self, entry):
+        """Convert an index ``entry`` into a JSON object."""
+        name, scope, docname, objtype = entry
+        record = {'name': name, 'scope': scope, 'docname': docname,
+                  'objtype': objtype, 'target': make_target(scope, name)}
+        symbol = (self.environment.top_level.get(name)
+                  if self.environment is not None else None)
+        if symbol is not None:
+            source = symbol.source_of_scope(scope)
+            record['feature'] = source.feature if source else None
+            record['documentation'] = symbol.properties.get(
+                scope + '-documentation')
+        return record
+
+    def _matches(self, start, predicate, scope, limit):
+        results = []
+        for index in xrange(start, len(self.entries)):
+            entry = self.entries[index]
+            if not predicate(entry[0]) or len(results) >= limit:
+                break
+            if scope is None or entry[1] == scope:
+                results.append(self.to_json(entry))
+        return results
+
+    def exact(self, name, scope=None, limit=DEFAULT_LIMIT):
+        """Find the symbol with ``name``, optionally only in ``scope``.
+
+        Return a list of JSON objects, one for each matching scope.
+
+        """
+        start = bisect_left(self.names, name)
+        return self._matches(start, lambda n: n == name, scope, limit)
+
+    def prefix(self, prefix, scope=None, limit=DEFAULT_LIMIT):
+        """Find at most ``limit`` symbols starting with ``prefix``.
+
+        If ``scope`` is given, only find symbols described in ``scope``.
+
+        Return a list of JSON objects, sorted by name and scope.
+
+        """
+        start = bisect_left(self.names, prefix)
+        return self._matches(start, lambda n: n.startswith(prefix), scope,
+                             limit)
+
+
+class ReadOnlyStoredEnvironment(StoredEnvironment):
+    """A :class:`~sphinxcontrib.emacs.lisp.store.StoredEnvironment` which
+    never clears its database.
+
+    The server must not clear the database, if the build changed it since the
+    environment was pickled.
+
+    """
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._connect()
+        self.reset = self.stored_version != self.version
+
+
+def find_global(module, name):
+    """Find the global ``name`` in ``module`` for unpickling.
+
+    Substitute :class:`ReadOnlyStoredEnvironment` for stored environments.
+
+    """
+    __import__(module)
+    value = getattr(sys.modules[module], name)
+    return ReadOnlyStoredEnvironment if value is StoredEnvironment else value
+
+
+def load_domaindata(filename):
+    """Load the Emacs Lisp domain data from the environment at ``filename``.
+
+    Return the domain data as dictionary.  Raise :exc:`LookupError`, if the
+    environment has no Emacs Lisp domain data.
+
+    """
+    with open(filename, 'rb') as source:
+        unpickler = pickle.Unpickler(source)
+        unpickler.find_global = find_global
+        env = unpickler.load()
+    domaindata = env.domaindata.get('el')
+    if domaindata is None:
+        raise LookupError('No Emacs Lisp domain data in {0}'.format(filename))
+    return domaindata
+
+
+class QueryService(object):
+    """Answer symbol queries from an environment pickle.
+
+    The pickle is loaded once, and loaded again if its modification time
+    changed since.  If loading fails, the previous index is kept, and loading
+    is tried again on the next query.
+
+    """
+
+    def __init__(self, filename):
+        """Create a new service for the environment pickle at ``filename``."""
+        self.filename = filename
+        self.mtime = None
+        self._index = None
+
+    @property
+    def index(self):
+        """The current :class:`SymbolIndex`.
+
+        Raise any of :data:`LOAD_ERRORS`, if the environment pickle cannot be
+        loaded and there is no previous index.
+
+        """
+        try:
+            mtime = os.stat(self.filename).st_mtime
+            if self._index is None or mtime != self.mtime:
+                self._index = SymbolIndex(load_domaindata(self.filename))
+                # Only remember the modification time of a complete load, to
+                # retry loads of a pickle that is still being written
+                self.mtime = mtime
+        except LOAD_ERRORS as error:
+            if self._index is None:
+                raise
+            sys.stderr.write('Cannot reload {0}, serving previous index: '
+                             '{1!r}\n'.format(self.filename, error))
+        return self._index
+
+    def answer(self, query):
+        """Answer a ``query``.
+
+        ``query`` is a dictionary with the kind of ``query``, and its
+        arguments.  Raise :exc:`QueryError` for invalid queries.
+
+        Return a list of JSON objects.
+
+        """
+        kind = query.get('query')
+        scope = query.get('scope') or None
+        try:
+            limit = int(query.get('limit', DEFAULT_LIMIT))
+        except ValueError:
+            raise QueryError('Invalid limit: {0!r}'.format(query['limit']))
+        if kind == 'exact' and query.get('name'):
+            return self.index.exact(query['name'], scope, limit)
+        elif kind == 'prefix' and 'prefix' in query:
+            return self.index.prefix(query['prefix'], scope, limit)
+        raise QueryError('Invalid query: {0!r}'.format(query))
+
+
+class HTTPQueryHandler(BaseHTTPRequestHandler):
+    """Answer queries over HTTP."""
+
+    def do_GET(self):    # pylint: disable=C0103
+        url = urlparse(self.path)
+        query = dict((key, values[-1])
+                     for key, values in parse_qs(url.query).iteritems())
+        query['query'] = url.path.strip('/')
+        try:
+            status, result = 200, self.server.service.answer(query)
+        except QueryError as error:
+            status, result = 400, {'error': unicode(error)}
+        except LOAD_ERRORS as error:
+            status, result = 503, {'error': unicode(error)}
+        body = json.dumps(result)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class SocketQueryHandler(StreamRequestHandler):
+    """Answer queries as JSON Lines over a stream socket."""
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                result = self.server.service.answer(json.loads(line))
+            except (ValueError, AttributeError) + LOAD_ERRORS as error:
+                result = {'error': unicode(error)}
+            self.wfile.write(json.dumps(result))
+            self.wfile.write('\n')
+            self.wfile.flush()
+
+
+def make_server(service, address=None, socket_path=None):
+    """Create a server for ``service``.
+
+    If ``socket_path`` is given, listen on a Unix socket at this path.
+    Otherwise serve HTTP on ``address``, a pair of host and port.
+
+    """
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = UnixStreamServer(socket_path, SocketQueryHandler)
+    else:
+        server = HTTPServer(address, HTTPQueryHandler)
+    server.service = service
+    return server
+
+
+def main(argv=None):
+    """Entry point of ``sphinx-emacs-serve``."""
+    parser = ArgumentParser(
+        description='Serve Emacs Lisp symbol queries from a built '
+        'documentation environment.')
+    parser.add_argument('environment',
+                        help='The environment.pickle of a build, or the '
+                        'doctree directory containing it')
+    parser.add_argument('-H', dest='host', default='127.0.0.1',
+                        help='Host to listen on (default: 127.0.0.1)')
+    parser.add_argument('-p', dest='port', type=int, default=8765,
+                        help='Port to listen on (default: 8765)')
+    parser.add_argument('-s', dest='socket', metavar='PATH',
+                        help='Listen on a Unix socket at PATH instead of HTTP')
+    args = parser.parse_args(argv)
+
+    filename = args.environment
+    if os.path.isdir(filename):
+        filename = os.path.join(filename, 'environment.pickle')
+    service = QueryService(filename)
+    sys.stderr.write('Loaded {0} symbols from {1}\n'.format(
+        len(service.index), filename))
+    server = make_server(service, address=(args.host, args.port),
+                         socket_path=args.socket)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,116 @@
+# -*- coding: utf-8; -*-
+# Copyright (c) 2014 Sebastian Wiesner <lunaryorn@gmail.com>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+"""Shards of Emacs Lisp domain data.
+
+Large projects can read disjoint subsets of their documents on separate
+machines.  Each machine exports the data of the Emacs Lisp domain into a shard
+file, and a final build merges all shards into its domain data before writing.
+
+A shard is a pickled dictionary with the domain data, the names of the
+documents of the shard, and a format version.  The interpreter environment is
+always stored as plain :class:`~sphinxcontrib.emacs.lisp.AbstractEnvironment`,
+so that shards do not depend on local databases.
+
+Shards only carry domain data.  The merging build must have all documents of
+the shards in its own project; data of other documents is dropped with a
+warning, so that no reference points to a page which the build does not write.
+
+"""
+
+
+import os
+import cPickle as pickle
+
+
+#: The version of the shard format.
+SHARD_VERSION = 1
+
+
+def export_shard(domain, docnames, filename):
+    """Export the data of ``domain`` for ``docnames`` into ``filename``."""
+    data = domain.data
+    interpreter_env = data['environment']
+    shard = {
+        'version': SHARD_VERSION,
+        'docnames': sorted(docnames),
+        'namespace': data['namespace'],
+        'consumers': data['consumers'],
+        'features': data['features'],
+        'environment': (interpreter_env.copy()
+                        if interpreter_env is not None else None),
+    }
+    directory = os.path.dirname(filename)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    with open(filename, 'wb') as sink:
+        pickle.dump(shard, sink, pickle.HIGHEST_PROTOCOL)
+
+
+def load_shard(filename):
+    """Load a shard from ``filename``.
+
+    Raise :exc:`ValueError`, if the shard has an unsupported format.
+
+    Return the shard as dictionary.
+
+    """
+    with open(filename, 'rb') as source:
+        shard = pickle.load(source)
+    if shard.get('version') != SHARD_VERSION:
+        raise ValueError('Unsupported shard format in {0}'.format(filename))
+    return shard
+
+
+def export_or_merge_shards(app, env):
+    """Export or merge shards after all documents were read.
+
+    If ``emacs_lisp_shard_export`` is set, export the domain data of all
+    documents of this build into this file.  Otherwise, merge all shards in
+    ``emacs_lisp_shard_merge`` into the domain data, replacing the data
+    merged by previous builds.  Drop the data of all documents which are not
+    in this project.
+
+    Both file names are relative to the configuration directory.
+
+    """
+    domain = env.domains['el']
+    export = app.config.emacs_lisp_shard_export
+    if export:
+        export_shard(domain, env.found_docs,
+                     os.path.join(app.confdir, export))
+        return
+    domain.clear_merged_data()
+    for filename in app.config.emacs_lisp_shard_merge:
+        try:
+            shard = load_shard(os.path.join(app.confdir, filename))
+        except (IOError, OSError, ValueError) as error:
+            app.warn('Cannot merge shard {0}: {1}'.format(filename, error))
+            continue
+        docnames = set(shard['docnames'])
+        missing = docnames - env.found_docs
+        if missing:
+            app.warn('Dropping data of documents missing in this project '
+                     'from shard {0}: {1}'.format(
+                         filename, ', '.join(sorted(missing))))
+        domain.merge_domaindata(docnames & env.found_docs, shard)
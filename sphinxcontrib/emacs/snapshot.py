@@ -0,0 +1,225 @@
+# -*- coding: utf-8; -*-
+# Copyright (c) 2014 Sebastian Wiesner <lunaryorn@gmail.com>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+"""Snapshots of interpreter environments.
+
+A snapshot holds a fully populated interpreter environment, to start builds
+from, instead of loading all libraries again.  Builds in fresh containers can
+share a snapshot, built once from the same pinned library sources.
+
+A snapshot file starts with a single line of JSON, which describes the
+snapshot: the format and interpreter versions, and the file name, size and
+digest of every feature in the snapshot.  The pickled
+:class:`~sphinxcontrib.emacs.lisp.AbstractEnvironment` follows.  A snapshot is
+only used if the interpreter version matches, and all libraries in the
+snapshot are unchanged.
+
+Besides the absolute file name, the description records the path of each
+library relative to its directory in the load path.  When loading a snapshot,
+libraries are located again in the current load path, so that a snapshot stays
+usable when the libraries are checked out in another place.
+
+"""
+
+
+import os
+import json
+import cPickle as pickle
+
+from sphinxcontrib.emacs.util import split_library_path
+
+
+#: The format identifier of snapshot files.
+SNAPSHOT_FORMAT = 'sphinxcontrib-emacs-snapshot'
+
+#: The version of the snapshot format.
+SNAPSHOT_VERSION = 2
+
+
+class SnapshotError(ValueError):
+    """A snapshot which cannot be used."""
+    pass
+
+
+def relative_library_path(filename, load_path):
+    """Get the path of the library ``filename`` relative to ``load_path``.
+
+    Return the path relative to the first directory of ``load_path`` which
+    contains ``filename``, or ``None``, if no directory contains it.
+
+    """
+    split = split_library_path(filename, load_path)
+    return split[1] if split else None
+
+
+def locate_library(path, load_path):
+    """Locate the library at the relative ``path`` in ``load_path``.
+
+    Return the canonical file name of the library in the first directory of
+    ``load_path`` which contains it, or ``None``, if there is none.
+
+    """
+    for directory in load_path:
+        filename = os.path.join(directory, path)
+        if os.path.isfile(filename):
+            return os.path.realpath(filename)
+    return None
+
+
+def snapshot_header(environment, load_path=()):
+    """Describe a snapshot of ``environment``.
+
+    ``load_path`` is the load path the libraries of ``environment`` were
+    loaded from.
+
+    Return the description as dictionary.
+
+    """
+    from sphinxcontrib.emacs.lisp import AbstractInterpreter
+    return {
+        'format': SNAPSHOT_FORMAT,
+        'version': SNAPSHOT_VERSION,
+        'interpreter_version': AbstractInterpreter.version,
+        'features': dict(
+            (name, {'filename': feature.filename,
+                    'path': feature.filename and relative_library_path(
+                        feature.filename, load_path),
+                    'size': feature.size, 'digest': feature.digest})
+            for name, feature in environment.features.iteritems()),
+    }
+
+
+def export_snapshot(environment, filename, load_path=()):
+    """Export a snapshot of ``environment`` into ``filename``.
+
+    ``load_path`` is the load path the libraries of ``environment`` were
+    loaded from, to locate them again when loading the snapshot.
+
+    The snapshot holds a plain copy of ``environment``, so that it does not
+    depend on local symbol databases.
+
+    """
+    directory = os.path.dirname(filename)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    with open(filename, 'wb') as sink:
+        sink.write(json.dumps(snapshot_header(environment, load_path),
+                              sort_keys=True))
+        sink.write('\n')
+        pickle.dump(environment.copy(), sink, pickle.HIGHEST_PROTOCOL)
+
+
+def read_snapshot_header(source):
+    """Read the description of a snapshot from the file object ``source``.
+
+    Raise :exc:`SnapshotError`, if the snapshot has an unsupported format or
+    was made by a different version of the interpreter.
+
+    Return the description as dictionary.
+
+    """
+    from sphinxcontrib.emacs.lisp import AbstractInterpreter
+    try:
+        header = json.loads(source.readline())
+    except ValueError:
+        raise SnapshotError('Not a snapshot')
+    if (not isinstance(header, dict) or
+            header.get('format') != SNAPSHOT_FORMAT or
+            header.get('version') != SNAPSHOT_VERSION):
+        raise SnapshotError('Unsupported snapshot format')
+    if header.get('interpreter_version') != AbstractInterpreter.version:
+        raise SnapshotError('Snapshot of interpreter version {0}, '
+                            'expected {1}'.format(
+                                header.get('interpreter_version'),
+                                AbstractInterpreter.version))
+    return header
+
+
+def load_snapshot(filename, load_path=()):
+    """Load the environment of the snapshot at ``filename``.
+
+    Locate all libraries of the snapshot in ``load_path`` by their relative
+    path, and move the environment to the libraries found.
+
+    Raise :exc:`SnapshotError`, if the snapshot cannot be used, in particular
+    if any library of the snapshot changed, as by
+    :meth:`~sphinxcontrib.emacs.lisp.AbstractEnvironment.outdated_features`.
+
+    Return the :class:`~sphinxcontrib.emacs.lisp.AbstractEnvironment` of the
+    snapshot.
+
+    """
+    with open(filename, 'rb') as source:
+        header = read_snapshot_header(source)
+        environment = pickle.load(source)
+    filenames = {}
+    for description in header['features'].itervalues():
+        path = description.get('path')
+        library = path and locate_library(path, load_path)
+        if library and library != description['filename']:
+            filenames[description['filename']] = library
+    environment.relocate(filenames)
+    outdated = environment.outdated_features()
+    if outdated:
+        raise SnapshotError('Libraries changed since the snapshot: {0}'.format(
+            ', '.join(sorted(feature.name for feature in outdated))))
+    return environment
+
+
+def start_from_snapshot(app):
+    """Start the Emacs Lisp domain from a snapshot.
+
+    Only has an effect if ``emacs_lisp_snapshot`` is set to the name of a
+    snapshot file, relative to the configuration directory, and if the domain
+    has no interpreter environment yet.
+
+    """
+    filename = app.config.emacs_lisp_snapshot
+    domain = app.env.domains['el']
+    if not filename or domain.data['environment'] is not None:
+        return
+    try:
+        environment = load_snapshot(os.path.join(app.confdir, filename),
+                                    app.config.emacs_lisp_load_path)
+    except (IOError, OSError, SnapshotError) as error:
+        app.warn('Cannot use snapshot {0}: {1}'.format(filename, error))
+        return
+    domain.start_from_environment(environment)
+    app.info('Emacs Lisp environment loaded from snapshot {0}'.format(
+        filename))
+
+
+def export_snapshot_after_build(app, exception):
+    """Export a snapshot of the interpreter environment after a build.
+
+    Only has an effect if ``emacs_lisp_snapshot_export`` is set to the name
+    of the snapshot file, relative to the configuration directory.
+
+    """
+    filename = app.config.emacs_lisp_snapshot_export
+    if exception or not filename:
+        return
+    environment = app.env.domaindata['el']['environment']
+    if environment is not None:
+        export_snapshot(environment, os.path.join(app.confdir, filename),
+                        app.config.emacs_lisp_load_path)
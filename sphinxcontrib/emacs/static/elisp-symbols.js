@@ -0,0 +1,92 @@
+/*
+ * elisp-symbols.js
+ * ~~~~~~~~~~~~~~~~
+ *
+ * Prefix completion over the Emacs Lisp symbol index of sphinxcontrib-emacs.
+ *
+ * The index is split into chunks by the first character of symbol names.
+ * Chunks are loaded lazily, and searched with a binary search.
+ *
+ * Usage:
+ *
+ *   ElispSymbols.complete('flycheck-', function (results) {
+ *     // results is a list of {name: ..., type: ..., uri: ...}
+ *   });
+ */
+
+var ElispSymbols = {
+
+  chunks: {},
+
+  callbacks: {},
+
+  chunkKey: function (name) {
+    var c = name.charAt(0).toLowerCase();
+    return /^[a-z0-9]$/.test(c) ? c : '_';
+  },
+
+  loadChunk: function (key, callback) {
+    if (this.chunks.hasOwnProperty(key)) {
+      callback(this.chunks[key]);
+      return;
+    }
+    if (this.callbacks.hasOwnProperty(key)) {
+      this.callbacks[key].push(callback);
+      return;
+    }
+    this.callbacks[key] = [callback];
+    var script = document.createElement('script');
+    script.type = 'text/javascript';
+    script.src = DOCUMENTATION_OPTIONS.URL_ROOT +
+      '_static/elisp-symbols/' + key + '.js';
+    script.onerror = function () {
+      ElispSymbols.setChunk(key, [], []);
+    };
+    document.getElementsByTagName('head')[0].appendChild(script);
+  },
+
+  setChunk: function (key, types, entries) {
+    var chunk = {types: types, entries: entries};
+    var callbacks = this.callbacks[key] || [];
+    this.chunks[key] = chunk;
+    delete this.callbacks[key];
+    for (var i = 0; i < callbacks.length; i++) {
+      callbacks[i](chunk);
+    }
+  },
+
+  lowerBound: function (entries, prefix) {
+    var low = 0, high = entries.length;
+    while (low < high) {
+      var middle = (low + high) >>> 1;
+      if (entries[middle][0] < prefix) {
+        low = middle + 1;
+      } else {
+        high = middle;
+      }
+    }
+    return low;
+  },
+
+  complete: function (prefix, callback, limit) {
+    limit = limit || 50;
+    if (!prefix) {
+      callback([]);
+      return;
+    }
+    this.loadChunk(this.chunkKey(prefix), function (chunk) {
+      var results = [];
+      var entries = chunk.entries;
+      for (var i = ElispSymbols.lowerBound(entries, prefix);
+           i < entries.length && results.length < limit; i++) {
+        var entry = entries[i];
+        if (entry[0].substring(0, prefix.length) !== prefix) {
+          break;
+        }
+        results.push({name: entry[0], type: chunk.types[entry[1]],
+                      uri: DOCUMENTATION_OPTIONS.URL_ROOT + entry[2]});
+      }
+      callback(results);
+    });
+  }
+};
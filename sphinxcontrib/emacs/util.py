@@ -23,6 +23,9 @@
 """Generic utilities."""
 
 
+import os
+
+
 def make_target(scope, name):
     """Create a target from ``scope`` and ``name``.
 
@@ -33,3 +36,37 @@ def make_target(scope, name):
 
     """
     return 'el.{0}.{1}'.format(scope, name)
+
+
+#: Initial characters which group symbols on their own.
+SYMBOL_INITIALS = 'abcdefghijklmnopqrstuvwxyz0123456789'
+
+
+def symbol_initial(name):
+    """Get the initial of the symbol ``name`` to group symbols by.
+
+    The initial is the lowercase first character of ``name``, if it is an
+    ASCII letter or digit, or ``_`` otherwise.
+
+    """
+    char = name[:1].lower()
+    return char if char and char in SYMBOL_INITIALS else '_'
+
+
+def split_library_path(filename, load_path):
+    """Split the library ``filename`` at its directory in ``load_path``.
+
+    ``filename`` is the canonical name of the library, as by
+    :func:`os.path.realpath`.
+
+    Return a pair ``(index, path)`` of the index of the first directory of
+    ``load_path`` which contains ``filename``, and the path of ``filename``
+    relative to this directory.  Return ``None``, if no directory contains
+    ``filename``.
+
+    """
+    for index, directory in enumerate(load_path):
+        path = os.path.relpath(filename, os.path.realpath(directory))
+        if not path.startswith(os.pardir):
+            return index, path
+    return None
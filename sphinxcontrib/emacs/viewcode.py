@@ -0,0 +1,222 @@
+# -*- coding: utf-8; -*-
+# Copyright (c) 2014 Sebastian Wiesner <lunaryorn@gmail.com>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+"""Highlighted source code pages for Emacs Lisp libraries.
+
+Like :mod:`sphinx.ext.viewcode`, but for Emacs Lisp: render each loaded
+library into a highlighted HTML page, and link every description of a symbol
+to the lines of its definition.
+
+Highlighting is expensive for large libraries, so the highlighted code is
+cached in the doctree directory, by the digest of the library contents.  Cache
+entries of libraries which are no longer loaded are removed after writing the
+pages.
+
+"""
+
+
+import os
+import sys
+import hashlib
+from io import open
+from cgi import escape
+
+from docutils import nodes
+from sphinx import addnodes
+from sphinx.util.nodes import make_refnode
+
+from sphinxcontrib.emacs.util import split_library_path
+
+
+#: The prefix of the names of source code pages.
+PAGE_PREFIX = '_elisp/'
+
+#: The prefix of line anchors in source code pages.
+LINE_ANCHOR = 'L'
+
+
+def get_lexer():
+    """Get the Pygments lexer for Emacs Lisp.
+
+    Fall back to Common Lisp, if Pygments has no dedicated Emacs Lisp lexer.
+
+    """
+    from pygments.lexers import get_lexer_by_name
+    from pygments.util import ClassNotFound
+    try:
+        return get_lexer_by_name('emacs-lisp')
+    except ClassNotFound:
+        return get_lexer_by_name('common-lisp')
+
+
+def highlight_library(filename, cache_file):
+    """Highlight the library at ``filename`` as HTML.
+
+    Look up the highlighted code in ``cache_file`` first, and cache the result
+    there.
+
+    Return the highlighted code as string.
+
+    """
+    from pygments import highlight
+    from pygments.formatters import HtmlFormatter
+    if os.path.isfile(cache_file):
+        with open(cache_file, encoding='utf-8') as source:
+            return source.read()
+    with open(filename, encoding='utf-8', errors='replace') as source:
+        code = source.read()
+    formatter = HtmlFormatter(linenos='inline', lineanchors=LINE_ANCHOR,
+                              anchorlinenos=True)
+    highlighted = highlight(code, get_lexer(), formatter)
+    cache_dir = os.path.dirname(cache_file)
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    with open(cache_file, 'w', encoding='utf-8') as sink:
+        sink.write(highlighted)
+    return highlighted
+
+
+def prune_cache(cache_dir, keep):
+    """Remove all files from ``cache_dir``, whose names are not in ``keep``.
+
+    """
+    if not os.path.isdir(cache_dir):
+        return
+    for name in os.listdir(cache_dir):
+        if name not in keep:
+            os.remove(os.path.join(cache_dir, name))
+
+
+def page_name(filename, load_path):
+    """Get the name of the source code page of the library ``filename``.
+
+    Each library file has a single page, however many features it provides.
+    The page is named after the path of the library relative to its directory
+    in ``load_path``.  Pages of libraries in later directories of the load
+    path are put into a sub-directory with the index of the directory, and
+    pages of libraries outside the load path into a sub-directory named after
+    the digest of their directory, so that libraries with the same file name
+    never share a page.
+
+    """
+    split = split_library_path(filename, load_path)
+    if split is None:
+        directory = os.path.dirname(filename)
+        if isinstance(directory, unicode):
+            directory = directory.encode('utf-8')
+        prefix = '_/{0}/'.format(hashlib.sha1(directory).hexdigest()[:12])
+        path = os.path.basename(filename)
+    else:
+        index, path = split
+        prefix = '_{0}/'.format(index) if index else ''
+    path = os.path.splitext(path)[0].replace(os.sep, '/')
+    return PAGE_PREFIX + prefix + path
+
+
+def add_source_links(app, doctree):
+    """Add links to the definitions of all described symbols in ``doctree``.
+
+    Only has an effect if ``emacs_lisp_viewcode`` is set.
+
+    The document is noted as consumer of every linked symbol.  Definitions
+    which moved within their library count as changed while source links are
+    enabled, so the document is read and written again with the new lines.
+
+    """
+    env = app.env
+    interpreter_env = env.domaindata['el']['environment']
+    if not env.config.emacs_lisp_viewcode or interpreter_env is None:
+        return
+    domain = env.domains['el']
+    for signode in doctree.traverse(addnodes.desc_signature):
+        for target in signode['ids']:
+            parts = target.split('.', 2)
+            if len(parts) != 3 or parts[0] != 'el':
+                continue
+            _, scope, name = parts
+            symbol = interpreter_env.top_level.get(name)
+            source = symbol and symbol.source_of_scope(scope)
+            if not (source and source.file and source.lines):
+                continue
+            domain.note_consumer(env.docname, name)
+            onlynode = addnodes.only(expr='html')
+            refnode = addnodes.pending_xref(
+                '', reftype='el-viewcode', refdomain='std', refexplicit=False,
+                reftarget=page_name(source.file,
+                                    env.config.emacs_lisp_load_path),
+                refid=target, refdoc=env.docname)
+            refnode += nodes.inline('', '[source]', classes=['viewcode-link'])
+            onlynode += refnode
+            signode += onlynode
+
+
+def resolve_source_link(app, env, node, contnode):
+    """Resolve a link to a source code page.
+
+    Link to the current first line of the definition of the symbol.
+
+    """
+    if node['reftype'] != 'el-viewcode':
+        return None
+    _, scope, name = node['refid'].split('.', 2)
+    interpreter_env = env.domaindata['el']['environment']
+    symbol = interpreter_env and interpreter_env.top_level.get(name)
+    source = symbol and symbol.source_of_scope(scope)
+    anchor = ('{0}-{1}'.format(LINE_ANCHOR, source.lines[0])
+              if source and source.lines else '')
+    return make_refnode(app.builder, node['refdoc'], node['reftarget'],
+                        anchor, contnode)
+
+
+def collect_pages(app):
+    """Create a source code page for each loaded library file.
+
+    Only has an effect if ``emacs_lisp_viewcode`` is set.
+
+    """
+    from sphinxcontrib.emacs.lisp import file_digest
+    interpreter_env = app.env.domaindata['el']['environment']
+    if not app.config.emacs_lisp_viewcode or interpreter_env is None:
+        return
+    cache_dir = os.path.join(app.doctreedir, 'el-viewcode')
+    cached = set()
+    filenames = set(feature.filename
+                    for feature in interpreter_env.features.itervalues())
+    for filename in sorted(f for f in filenames if f and os.path.isfile(f)):
+        cache_name = file_digest(filename) + '.html'
+        cached.add(cache_name)
+        highlighted = highlight_library(filename,
+                                        os.path.join(cache_dir, cache_name))
+        title = os.path.basename(filename)
+        if not isinstance(title, unicode):
+            title = title.decode(sys.getfilesystemencoding() or 'utf-8',
+                                 'replace')
+        context = {
+            'title': title,
+            'body': u'<h1>Source code for {0}</h1>{1}'.format(
+                escape(title), highlighted),
+            'parents': [],
+        }
+        yield (page_name(filename, app.config.emacs_lisp_load_path), context,
+               'page.html')
+    prune_cache(cache_dir, cached)
@@ -0,0 +1,173 @@
+# -*- coding: utf-8; -*-
+# Copyright (c) 2014 Sebastian Wiesner <lunaryorn@gmail.com>
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+
+"""Watch sources and rebuild documentation incrementally.
+
+The watcher keeps a single Sphinx application in memory, together with the
+build environment and the abstract interpreter of the Emacs Lisp domain.  On
+each change to a document or an Emacs Lisp library, it runs an incremental
+build, in which only the changed libraries are evaluated again.  A failed
+build is reported, and the watcher continues with the next change.
+
+"""
+
+
+import os
+import sys
+import time
+import traceback
+from argparse import ArgumentParser
+
+from sphinx.application import Sphinx
+
+
+def find_files(directory, suffixes):
+    """Find all files ending with any of ``suffixes`` below ``directory``.
+
+    Return a generator over the file names.  Skip hidden directories.
+
+    """
+    for dirpath, dirnames, filenames in os.walk(directory):
+        dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+        for filename in filenames:
+            if filename.endswith(suffixes):
+                yield os.path.join(dirpath, filename)
+
+
+def get_mtime(filename):
+    """Get the modification time of ``filename``, or ``None``."""
+    try:
+        return os.path.getmtime(filename)
+    except OSError:
+        return None
+
+
+class Watcher(object):
+    """Watch the sources of a Sphinx application, and rebuild on changes.
+
+    The watcher polls the document sources and all Emacs Lisp libraries in
+    ``emacs_lisp_load_path`` for changes.  The configuration is not watched,
+    because the application cannot load it again.
+
+    """
+
+    def __init__(self, app, interval=0.2):
+        """Create a new watcher for the Sphinx ``app``.
+
+        ``interval`` is the number of seconds between two polls.
+
+        """
+        self.app = app
+        self.interval = interval
+        self.mtimes = {}
+
+    def watched_files(self):
+        """Get all files to watch, as generator over file names."""
+        config = self.app.config
+        source_suffix = config.source_suffix
+        if isinstance(source_suffix, basestring):
+            source_suffix = [source_suffix]
+        for filename in find_files(self.app.srcdir, tuple(source_suffix)):
+            yield filename
+        for directory in config.emacs_lisp_load_path:
+            for filename in find_files(directory, ('.el',)):
+                yield filename
+
+    def poll(self):
+        """Poll all watched files for changes.
+
+        Return a list of all files which were changed, added or removed since
+        the last poll.
+
+        """
+        mtimes = dict((filename, get_mtime(filename))
+                      for filename in self.watched_files())
+        changed = [filename for filename in set(mtimes) | set(self.mtimes)
+                   if mtimes.get(filename) != self.mtimes.get(filename)]
+        self.mtimes = mtimes
+        return changed
+
+    def build(self):
+        """Run an incremental build.
+
+        Report errors of the build instead of raising them, since libraries
+        and documents are often broken while being edited.
+
+        """
+        start = time.time()
+        try:
+            self.app.build()
+        except Exception:   # pylint: disable=W0703
+            self.app.warn('build failed:\n' + traceback.format_exc().rstrip())
+            return
+        self.app.info('build finished in {0:.2f}s'.format(time.time() - start))
+
+    def run(self):
+        """Build, and rebuild whenever a watched file changes.
+
+        Run until interrupted.
+
+        """
+        self.poll()
+        self.build()
+        while True:
+            time.sleep(self.interval)
+            changed = self.poll()
+            if changed:
+                for filename in sorted(changed):
+                    self.app.info('changed: {0}'.format(filename))
+                self.build()
+
+
+def main(argv=None):
+    """Entry point of ``sphinx-emacs-watch``."""
+    parser = ArgumentParser(
+        description='Watch sources and rebuild documentation incrementally.')
+    parser.add_argument('sourcedir', help='Directory with document sources')
+    parser.add_argument('outdir', help='Output directory')
+    parser.add_argument('-b', dest='builder', default='html',
+                        help='Builder to use (default: html)')
+    parser.add_argument('-c', dest='confdir',
+                        help='Directory with conf.py (default: sourcedir)')
+    parser.add_argument('-d', dest='doctreedir',
+                        help='Directory for doctrees and the environment '
+                        '(default: outdir/.doctrees)')
+    parser.add_argument('-i', dest='interval', type=float, default=0.2,
+                        help='Seconds between two polls (default: 0.2)')
+    args = parser.parse_args(argv)
+
+    sourcedir = os.path.abspath(args.sourcedir)
+    outdir = os.path.abspath(args.outdir)
+    confdir = os.path.abspath(args.confdir or sourcedir)
+    doctreedir = os.path.abspath(args.doctreedir or
+                                 os.path.join(outdir, '.doctrees'))
+    app = Sphinx(sourcedir, confdir, outdir, doctreedir, args.builder,
+                 status=sys.stdout, warning=sys.stderr)
+    try:
+        Watcher(app, interval=args.interval).run()
+    except KeyboardInterrupt:
+        return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())